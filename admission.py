@@ -0,0 +1,142 @@
+import asyncio
+import math
+import os
+from collections import defaultdict
+
+from metrics import metrics
+
+
+# Raised when a chat request is not admitted; main.py turns it into a 429/503 with Retry-After
+class Rejected(Exception):
+    def __init__(self, status_code, detail, retry_after):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+# An admitted chat request. Identical submissions from the same user wait on its future.
+class Ticket:
+    def __init__(self, key):
+        self.key = key
+        self.future = asyncio.get_running_loop().create_future()
+        self.followers = 0
+        self.finished = False
+
+
+# Admission control for chat requests (everything that may end in an LLM call):
+# - identical in-flight messages from one user are coalesced onto a single leader request,
+#   which alone calls the model and stores the turn;
+# - each user may have at most max_per_user distinct requests in flight (429 beyond that);
+# - at most max_pending requests are admitted overall; beyond that requests are shed
+#   immediately with 503 instead of queueing behind the LLM concurrency limit.
+# Retry-After is the expected time to drain the backlog at the recent median LLM latency.
+class ChatAdmission:
+    def __init__(self, max_per_user=2, max_pending=64, llm_slots=10, retry_after_min=1, retry_after_max=60):
+        self.max_per_user = max_per_user
+        self.max_pending = max_pending
+        self.llm_slots = llm_slots
+        self.retry_after_min = retry_after_min
+        self.retry_after_max = retry_after_max
+        self._inflight = {}
+        self._per_user = defaultdict(int)
+        self.pending = 0
+        self.coalesced = 0
+        self.rejected_user = 0
+        self.shed = 0
+
+    @classmethod
+    def from_env(cls, llm_slots=10):
+        return cls(
+            max_per_user=int(os.getenv("CHAT_MAX_PER_USER", "2")),
+            max_pending=int(os.getenv("CHAT_MAX_PENDING", "64")),
+            llm_slots=llm_slots,
+            retry_after_min=int(os.getenv("CHAT_RETRY_AFTER_MIN", "1")),
+            retry_after_max=int(os.getenv("CHAT_RETRY_AFTER_MAX", "60")),
+        )
+
+    # Ticket of an identical request already in flight, or None
+    def inflight(self, user_id, message):
+        ticket = self._inflight.get((user_id, message))
+        if ticket is not None:
+            ticket.followers += 1
+            self.coalesced += 1
+        return ticket
+
+    # Admit a new leader request or raise Rejected; pair every admit with finish()
+    def admit(self, user_id, message):
+        if self._per_user[user_id] >= self.max_per_user:
+            self.rejected_user += 1
+            metrics.inc("chat_rejected_total", reason="user_limit")
+            raise Rejected(429, "Too many chat requests in progress, please wait for a reply.", self.retry_after())
+        if self.pending >= self.max_pending:
+            self.shed += 1
+            metrics.inc("chat_rejected_total", reason="overloaded")
+            raise Rejected(503, "The assistant is busy, please try again shortly.", self.retry_after())
+        ticket = Ticket((user_id, message))
+        self._inflight[ticket.key] = ticket
+        self._per_user[user_id] += 1
+        self.pending += 1
+        return ticket
+
+    # Release the leader's slot and hand its result (or exception) to any followers.
+    # Idempotent: only the first call for a ticket counts.
+    def finish(self, ticket, result=None, error=None):
+        if ticket.finished:
+            return
+        ticket.finished = True
+        if self._inflight.get(ticket.key) is ticket:
+            del self._inflight[ticket.key]
+        user_id = ticket.key[0]
+        self._per_user[user_id] -= 1
+        if not self._per_user[user_id]:
+            del self._per_user[user_id]
+        self.pending -= 1
+        if ticket.future.done():
+            return
+        if error is None:
+            ticket.future.set_result(result)
+        elif isinstance(error, asyncio.CancelledError):
+            ticket.future.cancel()
+        else:
+            ticket.future.set_exception(error)
+            ticket.future.exception()  # retrieved here so a leader without followers logs no warning
+
+    # Follower side: the leader's result (or its exception)
+    async def wait(self, ticket):
+        try:
+            return await asyncio.shield(ticket.future)
+        except asyncio.CancelledError:
+            if ticket.future.cancelled():
+                raise Rejected(503, "The original request was cancelled, please try again.", self.retry_after_min)
+            raise
+
+    # Run fn() as the leader for (user_id, message), or share the result of the identical request in flight
+    async def submit(self, user_id, message, fn):
+        ticket = self.inflight(user_id, message)
+        if ticket is not None:
+            return await self.wait(ticket)
+        ticket = self.admit(user_id, message)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.finish(ticket, error=e)
+            raise
+        self.finish(ticket, result)
+        return result
+
+    # Backlog per LLM slot times the median LLM call; streamed answers (/chat/stream) record
+    # llm_stream instead of llm, so the slower of the two medians seen so far is used
+    def retry_after(self):
+        medians = [metrics.quantile("stage_duration_seconds", 0.5, stage=stage) for stage in ("llm", "llm_stream")]
+        llm_p50 = max(medians) or 1.0
+        estimate = math.ceil(self.pending / max(1, self.llm_slots) * llm_p50)
+        return max(self.retry_after_min, min(self.retry_after_max, estimate))
+
+    def stats(self):
+        return {
+            "pending": self.pending,
+            "users": len(self._per_user),
+            "coalesced": self.coalesced,
+            "rejected_user_limit": self.rejected_user,
+            "shed": self.shed,
+        }
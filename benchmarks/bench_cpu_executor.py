@@ -0,0 +1,105 @@
+# Benchmark: event-loop lag and throughput of classification + sanitization run inline
+# on the loop vs. in a thread pool vs. in 1..N worker processes (cpu_executor.py).
+#
+# Concurrent clients each classify a message and sanitize a model response in a loop.
+# A probe task sleeps for --probe-ms and records how late it wakes up; that delay is
+# what every other request on the event loop (health checks, streamed deltas) waits.
+#
+#   SPACY_MODEL=en_core_web_md python benchmarks/bench_cpu_executor.py --clients 32 --duration 5
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from cpu_executor import CPUExecutor  # noqa: E402
+from fallback import format_medical_response  # noqa: E402
+
+QUERIES = [
+    "i have a headache and fever since yesterday",
+    "my chest hurts when i breathe deeply",
+    "what is the weather like today",
+    "persistent dry cough for two weeks and a sore throat",
+    "can you recommend a good movie",
+    "feeling dizzy and tired after standing up",
+]
+
+
+def model_response(query):
+    # Roughly the size of a real answer, with attributes and a script for bleach to strip
+    body = format_medical_response(query, ["headache", "fever"])
+    return '<p class="intro" onclick="x()">' + body + "<script>alert(1)</script></p>" * 2
+
+
+def quantile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def probe(lags, interval, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def client(executor, stop, counts):
+    while not stop.is_set():
+        query = random.choice(QUERIES)
+        await executor.classify(query)
+        await executor.sanitize(model_response(query))
+        counts[0] += 1
+        # A real request awaits I/O between these steps; inline mode never yields otherwise
+        await asyncio.sleep(0)
+
+
+async def run(mode, workers, args):
+    executor = CPUExecutor(mode, workers, batch_max=args.batch_max, batch_wait=args.batch_wait_ms / 1000)
+    await executor.start()
+    # Load spaCy where the work runs before timing anything
+    await executor.classify("warm up")
+    stop = asyncio.Event()
+    lags, counts = [], [0]
+    tasks = [asyncio.create_task(probe(lags, args.probe_ms / 1000, stop))]
+    tasks += [asyncio.create_task(client(executor, stop, counts)) for _ in range(args.clients)]
+    start = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    stats = executor.stats()
+    executor.shutdown()
+    return {
+        "ops_per_second": counts[0] / elapsed,
+        "lag_p50_ms": quantile(lags, 0.5) * 1000,
+        "lag_p99_ms": quantile(lags, 0.99) * 1000,
+        "lag_max_ms": max(lags, default=0.0) * 1000,
+        "mean_batch": stats["mean_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--modes", nargs="+", default=["inline", "thread", "process"])
+    parser.add_argument("--probe-ms", type=float, default=5.0)
+    parser.add_argument("--batch-max", type=int, default=32)
+    parser.add_argument("--batch-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'workers':>7} {'ops/s':>8} {'lag p50':>8} {'lag p99':>8} {'lag max':>8} {'batch':>6}")
+    for mode in args.modes:
+        for workers in ([1] if mode == "inline" else sorted(set(args.workers))):
+            result = asyncio.run(run(mode, workers, args))
+            print(
+                f"{mode:>8} {workers:>7} {result['ops_per_second']:>8.0f} {result['lag_p50_ms']:>6.1f}ms "
+                f"{result['lag_p99_ms']:>6.1f}ms {result['lag_max_ms']:>6.1f}ms {result['mean_batch']:>6.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Benchmark: connection checkout latency under concurrent load, using aiosqlite as a
+# stand-in for MySQL. Compares pool sizes and the read-only (autocommit) engine.
+#
+#   python benchmarks/bench_db_pool.py --concurrency 50 --requests 2000
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run(engine, concurrency, requests):
+    checkouts = []
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            async with engine.connect() as conn:
+                checkouts.append((time.perf_counter() - start) * 1000)
+                await conn.execute(text("SELECT 1"))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    checkouts.sort()
+    return {
+        "p50": statistics.median(checkouts),
+        "p95": percentile(checkouts, 95),
+        "p99": percentile(checkouts, 99),
+        "rps": requests / elapsed,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 5, 10, 20])
+    args = parser.parse_args()
+
+    # Apply the same settings database.py reads, then import its option builder
+    os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+    from database import engine_options
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        print(f"{'engine':>22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+        for pool_size in args.pool_sizes:
+            for label, extra in (("rw", {}), ("read-only", {"isolation_level": "AUTOCOMMIT"})):
+                os.environ["DB_POOL_SIZE"] = str(pool_size)
+                os.environ["DB_MAX_OVERFLOW"] = "0"
+                engine = create_async_engine(url, **engine_options(url), **extra)
+                try:
+                    result = await run(engine, args.concurrency, args.requests)
+                finally:
+                    await engine.dispose()
+                name = f"pool={pool_size} {label}"
+                print(f"{name:>22} {result['p50']:>8.3f} {result['p95']:>8.3f} {result['p99']:>8.3f} {result['rps']:>8.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+# Benchmark: context/history query latency on the chats table before and after
+# the (user_id, is_deleted, timestamp) index, using SQLite as a stand-in for MySQL.
+#
+#   python benchmarks/bench_history_index.py --rows 2000000 --users 5000
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from base import Base  # noqa: E402
+from history import recent_turns_query  # noqa: E402
+from migrate_db import apply_migrations  # noqa: E402
+
+INDEX_NAME = "ix_chats_user_deleted_timestamp"
+
+
+def seed(engine, rows, users, deleted_ratio, batch=50000):
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+    start_ts = datetime(2024, 1, 1)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for offset in range(0, rows, batch):
+            values = [
+                (
+                    random.randint(1, users),
+                    "I have a headache and fever",
+                    "<p>Response</p>",
+                    (start_ts + timedelta(seconds=i)).isoformat(sep=" "),
+                    random.random() < deleted_ratio,
+                )
+                for i in range(offset, min(offset + batch, rows))
+            ]
+            cursor.executemany(
+                "INSERT INTO chats (user_id, message, response, timestamp, is_deleted) VALUES (?, ?, ?, ?, ?)",
+                values,
+            )
+            raw.commit()
+    finally:
+        raw.close()
+
+
+def measure(engine, users, queries, max_turns):
+    explain = recent_turns_query(1, max_turns).compile(engine, compile_kwargs={"literal_binds": True})
+    latencies = []
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {explain}").fetchall()
+        for _ in range(queries):
+            query = recent_turns_query(random.randint(1, users), max_turns)
+            start = time.perf_counter()
+            rows = conn.execute(query).fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert len(rows) <= max_turns
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "mean_ms": statistics.mean(latencies),
+        "plan": " / ".join(row[-1] for row in plan),
+    }
+
+
+def report(label, result):
+    print(f"{label:>7}: p50={result['p50_ms']:.3f}ms p95={result['p95_ms']:.3f}ms mean={result['mean_ms']:.3f}ms")
+    print(f"         plan: {result['plan']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="bench_history.db")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--deleted-ratio", type=float, default=0.3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--max-turns", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded database file")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    engine = create_engine(f"sqlite:///{args.db}")
+    try:
+        start = time.perf_counter()
+        seed(engine, args.rows, args.users, args.deleted_ratio)
+        print(f"seeded {args.rows} rows for {args.users} users in {time.perf_counter() - start:.1f}s")
+
+        report("before", measure(engine, args.users, args.queries, args.max_turns))
+
+        start = time.perf_counter()
+        apply_migrations(engine)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        print(f"migration (index build) took {time.perf_counter() - start:.1f}s")
+
+        report("after", measure(engine, args.users, args.queries, args.max_turns))
+    finally:
+        engine.dispose()
+        if not args.keep and os.path.exists(args.db):
+            os.remove(args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Benchmark: LLMRouter against local stub servers (mock_groq.py).
+#   tail:     two backends with 3% latency spikes (1 s), without and with hedging
+#   failover: the primary always fails (503); its breaker trips and traffic moves to the secondary
+#   outage:   every backend fails; time until the local fallback can be served
+#
+#   python benchmarks/bench_llm_router.py --requests 200 --concurrency 10
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from llm_client import AsyncLLMClient
+from llm_router import AllBackendsFailed, Backend, CircuitBreaker, LLMRouter
+
+MOCK = os.path.join(os.path.dirname(__file__), "mock_groq.py")
+MESSAGES = [{"role": "user", "content": "I have a headache"}]
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def start_mock(port, *flags):
+    return subprocess.Popen([sys.executable, MOCK, "--port", str(port), *flags], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(port):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"http://127.0.0.1:{port}/stats")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"mock on port {port} did not start")
+
+
+def backend(name, port, timeout=5.0):
+    client = AsyncLLMClient(f"http://127.0.0.1:{port}/openai/v1/chat/completions", "bench", max_retries=0, max_concurrency=64)
+    return Backend(name, client, timeout=timeout, breaker=CircuitBreaker(failure_threshold=5, reset_timeout=60))
+
+
+async def drive(router, requests, concurrency):
+    latencies, failures = [], 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        nonlocal failures
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                await router.chat_completion(MESSAGES)
+            except AllBackendsFailed:
+                failures += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "failed": failures,
+    }
+
+
+def report(name, router, result):
+    calls = " ".join(f"{b.name}={b.calls}/{b.failures}fail/{b.breaker.state}" for b in router.backends)
+    print(f"{name:>22} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f} {result['failed']:>7} "
+          f"{router.hedges:>7} {router.hedge_wins:>5}  {calls}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8101)
+    args = parser.parse_args()
+
+    spiky = ["--latency", "0.05", "--slow-rate", "0.03", "--slow-latency", "1.0"]
+    mocks = [
+        start_mock(args.port, *spiky),
+        start_mock(args.port + 1, *spiky),
+        start_mock(args.port + 2, "--latency", "0.02", "--error-rate", "1", "--error-status", "503"),
+    ]
+    try:
+        for offset in range(3):
+            await wait_ready(args.port + offset)
+        a, b, down = args.port, args.port + 1, args.port + 2
+        print(f"{'scenario':>22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7} {'hedges':>7} {'wins':>5}  backend calls")
+
+        scenarios = [
+            ("tail, single backend", LLMRouter([backend("a", a)], hedge=False)),
+            ("tail, no hedging", LLMRouter([backend("a", a), backend("b", b)], hedge=False)),
+            ("tail, hedged at p95", LLMRouter([backend("a", a), backend("b", b)], hedge_min_delay=0.05, hedge_min_samples=20)),
+            ("failover", LLMRouter([backend("down", down), backend("b", b)], hedge=False)),
+            ("outage", LLMRouter([backend("down", down), backend("down2", down)], hedge=False)),
+        ]
+        for name, router in scenarios:
+            if name.startswith("tail, hedged"):
+                # Learn the latency distribution before measuring
+                await drive(router, 50, args.concurrency)
+                router.hedges = router.hedge_wins = 0
+            try:
+                result = await drive(router, args.requests, args.concurrency)
+            finally:
+                await router.aclose()
+            report(name, router, result)
+    finally:
+        for mock in mocks:
+            mock.terminate()
+            mock.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
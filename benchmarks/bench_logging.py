@@ -0,0 +1,126 @@
+# Benchmark: /chat handler throughput with logging off, with the old synchronous
+# FileHandler/StreamHandler setup (full message bodies), and with the queued JSON pipeline.
+# The LLM call is replaced by a canned response so only handler, DB and logging cost remain.
+# --flush-delay-ms simulates a slow or contended disk by sleeping in every handler flush.
+#
+#   python benchmarks/bench_logging.py --requests 2000 --concurrency 20 --flush-delay-ms 2
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MODES = ["off", "sync", "queued"]
+
+RESPONSE = "<p>I'm sorry you're feeling this way.</p><ul>" + "<li><strong>Cause</strong> explanation text</li>" * 20 + "</ul>"
+
+
+def slow_down_flush(delay):
+    original = logging.StreamHandler.flush
+
+    def slow_flush(self):
+        time.sleep(delay)
+        original(self)
+
+    logging.StreamHandler.flush = slow_flush
+
+
+async def run_mode(mode, requests, concurrency):
+    sys.path.insert(0, ROOT)
+    import log_config
+    import main
+    from base import Base
+    from database import AsyncSessionLocal, engine
+
+    if mode == "off":
+        logging.disable(logging.CRITICAL)
+    elif mode == "sync":
+        log_config.shutdown_logging()
+        log_config.LOG_BODIES = "full"
+        logging.getLogger().handlers = [logging.FileHandler(os.path.join("logs", "sync.log")), logging.StreamHandler()]
+
+    async def fake_handle_chat(user_id, user_input, db):
+        return RESPONSE
+
+    main.handle_chat = fake_handle_chat
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                await main.process_chat_message({"id": i % 50, "username": "bench"}, "I have a headache and fever", db)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    flush_start = time.perf_counter()
+    log_config.shutdown_logging()
+    flush = time.perf_counter() - flush_start
+    await engine.dispose()
+    latencies.sort()
+    return {
+        "mode": mode,
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "final_flush_s": flush,
+    }
+
+
+def child(args):
+    workdir = tempfile.mkdtemp(prefix="bench-logging-")
+    os.chdir(workdir)
+    for name in ("static", "templates", "logs"):
+        os.makedirs(name, exist_ok=True)
+    os.environ.update(
+        DATABASE_URL="sqlite+aiosqlite://",
+        LOG_DIR=os.path.join(workdir, "logs"),
+        MEDICAL_TERMS_PATH=os.path.join(ROOT, "medical_term.txt"),
+        SESSION_SECRET="bench",
+    )
+    if args.flush_delay_ms:
+        slow_down_flush(args.flush_delay_ms / 1000)
+    result = asyncio.run(run_mode(args.mode, args.requests, args.concurrency))
+    sys.stdout.write(json.dumps(result) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--flush-delay-ms", type=float, default=0.0)
+    parser.add_argument("--mode", choices=MODES)
+    args = parser.parse_args()
+    if args.mode:
+        return child(args)
+
+    print(f"{'mode':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'final flush s':>14}")
+    for mode in MODES:
+        out = subprocess.run(
+            [
+                sys.executable, __file__, "--mode", mode, "--requests", str(args.requests),
+                "--concurrency", str(args.concurrency), "--flush-delay-ms", str(args.flush_delay_ms),
+            ],
+            capture_output=True, text=True, check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{r['mode']:>7} {r['rps']:>8.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['final_flush_s']:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
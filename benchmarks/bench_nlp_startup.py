@@ -0,0 +1,81 @@
+# Benchmark: NLP startup cost per worker process.
+#
+#   legacy       full pipeline + nlp() over every term line (the old import-time path)
+#   slim-cold    vectors-only pipeline, term vectors built and written to the cache
+#   slim-cached  vectors-only pipeline, term vectors memory-mapped from the cache
+#   index-only   term vectors from the cache without the model (lazy first request pays the model load)
+#
+#   python benchmarks/bench_nlp_startup.py --runs 3
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+SCENARIOS = {
+    "legacy": """
+import spacy
+nlp = spacy.load(MODEL)
+with open(TERMS) as f:
+    docs = [nlp(line.strip()) for line in f if line.strip()]
+""",
+    "slim-cold": """
+import shutil
+shutil.rmtree(os.environ["NLP_CACHE_DIR"], ignore_errors=True)
+import nlp_model
+nlp_model.warm()
+""",
+    "slim-cached": """
+import nlp_model
+nlp_model.warm()
+""",
+    "index-only": """
+import nlp_model
+nlp_model.get_term_index()
+""",
+}
+
+HARNESS = """
+import os, sys, time, json, resource
+sys.path.insert(0, {root!r})
+MODEL = os.environ["SPACY_MODEL"]
+TERMS = os.environ["MEDICAL_TERMS_PATH"]
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def run(name, env):
+    code = HARNESS.format(root=ROOT, body=SCENARIOS[name])
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=os.getenv("SPACY_MODEL", "en_core_web_md"))
+    parser.add_argument("--terms", default=os.path.join(ROOT, "medical_term.txt"))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="nlp-cache-")
+    env = dict(os.environ, SPACY_MODEL=args.model, MEDICAL_TERMS_PATH=os.path.abspath(args.terms), NLP_CACHE_DIR=cache_dir)
+    try:
+        print(f"{'scenario':>12} {'best s':>8} {'mean s':>8} {'max rss MB':>11}")
+        for name in SCENARIOS:
+            results = [run(name, env) for _ in range(args.runs)]
+            seconds = [r["seconds"] for r in results]
+            rss = max(r["max_rss_mb"] for r in results)
+            print(f"{name:>12} {min(seconds):>8.3f} {sum(seconds) / len(seconds):>8.3f} {rss:>11.1f}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
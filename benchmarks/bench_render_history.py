@@ -0,0 +1,89 @@
+# Benchmark: preparing a long chat history for the chat page, the old way (bleach.clean on
+# every response on every view) versus the stored-HTML-is-trusted path, cold and from the
+# render cache. Each variant also renders the result through a Jinja template.
+#
+#   python benchmarks/bench_render_history.py --turns 1000 --views 20
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import bleach
+from jinja2 import Environment
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models import Chat
+from render_cache import HistoryRenderCache, render_history
+from sanitizer import sanitize_html
+
+RESPONSE = (
+    "<p>I'm sorry you're feeling this way.</p><h3>Possible causes</h3><ul>"
+    + "<li><strong>Tension</strong> &amp; stress can cause headaches</li>" * 8
+    + "</ul><p>This information is for general guidance only.</p>"
+)
+
+TEMPLATE = Environment(autoescape=True).from_string(
+    "{% for m in chat_history %}<div class=\"{{ 'user' if m.user else 'bot' }}\">{{ m.text }}</div>{% endfor %}"
+)
+LEGACY_TEMPLATE = Environment(autoescape=True).from_string(
+    "{% for m in chat_history %}<div class=\"{{ 'user' if m.user else 'bot' }}\">"
+    "{% if m.user %}{{ m.text }}{% else %}{{ m.text|safe }}{% endif %}</div>{% endfor %}"
+)
+
+
+def legacy_history(chats):
+    chat_history = []
+    for chat in chats:
+        chat_history.append({"user": True, "text": chat.message, "timestamp": chat.timestamp})
+        chat_history.append({
+            "user": False,
+            "text": bleach.clean(chat.response, tags=['p', 'ul', 'li', 'h3', 'strong'], attributes={}),
+            "timestamp": chat.timestamp
+        })
+    return chat_history
+
+
+def measure(fn, views):
+    samples = []
+    for _ in range(views):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--views", type=int, default=20)
+    args = parser.parse_args()
+
+    now = datetime.now()
+    # Stored responses are already sanitized at write time
+    chats = [
+        Chat(id=i, user_id=1, message=f"I have had a headache for {i} days", response=sanitize_html(RESPONSE),
+             timestamp=now + timedelta(seconds=i))
+        for i in range(args.turns)
+    ]
+    cache = HistoryRenderCache()
+    cache.begin_load(1)
+    cache.fill(1, render_history(chats))
+
+    variants = [
+        ("before: bleach per view", lambda: legacy_history(chats), lambda: LEGACY_TEMPLATE.render(chat_history=legacy_history(chats))),
+        ("after: cold (trusted)", lambda: render_history(chats), lambda: TEMPLATE.render(chat_history=render_history(chats).chat_history)),
+        ("after: render cache hit", lambda: cache.get(1), lambda: TEMPLATE.render(chat_history=cache.get(1).chat_history)),
+    ]
+    assert LEGACY_TEMPLATE.render(chat_history=legacy_history(chats)) == TEMPLATE.render(chat_history=cache.get(1).chat_history)
+
+    print(f"{args.turns} turns, median of {args.views} views")
+    print(f"{'variant':>26} {'prepare ms':>11} {'+ template ms':>14}")
+    for name, prepare, full in variants:
+        print(f"{name:>26} {measure(prepare, args.views):>11.2f} {measure(full, args.views):>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Benchmark: per-term Doc.similarity loop vs. vectorized TermIndex lookup.
+#
+#   python benchmarks/bench_term_index.py --sizes 50 500 2000 --repeat 200
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import spacy
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from term_index import TermIndex  # noqa: E402
+
+QUERIES = [
+    "i have a headache and fever",
+    "my chest hurts when i breathe",
+    "what is the weather like today",
+    "persistent dry cough for two weeks",
+    "can you recommend a good movie",
+]
+
+
+def read_terms(path):
+    with open(path, "r") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def loop_classify(user_doc, term_docs, threshold):
+    return any(user_doc.similarity(term_doc) > threshold for term_doc in term_docs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="en_core_web_md")
+    parser.add_argument("--terms", default=os.path.join(os.path.dirname(__file__), "..", "medical_term.txt"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 2000, 5000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    nlp = spacy.load(args.model)
+    base_terms = read_terms(args.terms)
+    query_docs = [nlp(q) for q in QUERIES]
+
+    print(f"{'terms':>7} {'unique':>7} {'loop ms/q':>10} {'index ms/q':>11} {'speedup':>8}")
+    for size in args.sizes:
+        raw_terms = list(itertools.islice(itertools.cycle(base_terms), size))
+        term_docs = [nlp(t) for t in raw_terms]
+        index = TermIndex.from_nlp(nlp, raw_terms)
+
+        n = args.repeat * len(query_docs)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            loop_results = [loop_classify(doc, term_docs, args.threshold) for doc in query_docs]
+        loop_ms = (time.perf_counter() - start) * 1000 / n
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            index_results = [index.best_match(doc.vector, args.threshold).is_medical for doc in query_docs]
+        index_ms = (time.perf_counter() - start) * 1000 / n
+
+        if loop_results != index_results:
+            print(f"  mismatch at size {size}: loop={loop_results} index={index_results}")
+        print(f"{size:>7} {len(index):>7} {loop_ms:>10.3f} {index_ms:>11.4f} {loop_ms / index_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
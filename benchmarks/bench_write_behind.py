@@ -0,0 +1,96 @@
+# Benchmark: persisting chat turns with one commit per request (current behaviour) versus
+# the write-behind buffer (multi-row INSERT per batch), on a file-backed SQLite database.
+# Reports turns stored per second, database transactions per second and per-request latency.
+#
+#   python benchmarks/bench_write_behind.py --requests 5000 --concurrency 50 --batch-sizes 10 100 500
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+from base import Base
+from models import Chat
+from write_buffer import ChatWriteBuffer
+
+RESPONSE = "<p>I'm sorry you're feeling this way.</p><ul>" + "<li><strong>Cause</strong> explanation text</li>" * 10 + "</ul>"
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run(engine, writer, requests, concurrency):
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        async with session_factory() as db:
+            while not queue.empty():
+                i = queue.get_nowait()
+                chat = Chat(user_id=i % 200, message=f"I have a headache {i}", response=RESPONSE, timestamp=datetime.now())
+                start = time.perf_counter()
+                if writer:
+                    await writer.add(chat)
+                else:
+                    db.add(chat)
+                    await db.commit()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    if writer:
+        await writer.close()
+    elapsed = time.perf_counter() - start
+    async with engine.connect() as conn:
+        stored = (await conn.execute(select(func.count()).select_from(Chat))).scalar()
+    assert stored == requests, (stored, requests)
+    latencies.sort()
+    return {
+        "rows_per_s": requests / elapsed,
+        "commits_per_s": (writer.commits if writer else requests) / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--flush-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"{'mode':>22} {'turns/s':>9} {'commits/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    modes = [("per-request commit", None)] + [(f"write-behind {size}", size) for size in args.batch_sizes]
+    with tempfile.TemporaryDirectory() as tmp:
+        for index, (name, batch_size) in enumerate(modes):
+            engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, f'bench{index}.db')}")
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            writer = None
+            if batch_size:
+                writer = ChatWriteBuffer(engine, enabled=True, batch_size=batch_size, flush_interval=args.flush_interval)
+            try:
+                r = await run(engine, writer, args.requests, args.concurrency)
+            finally:
+                await engine.dispose()
+            print(f"{name:>22} {r['rows_per_s']:>9.0f} {r['commits_per_s']:>10.0f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
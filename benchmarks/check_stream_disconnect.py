@@ -0,0 +1,93 @@
+# Regression check: a /chat/stream client that disconnects before the response body is
+# first iterated must not leak its admission slot. Drives the ASGI app directly (no server,
+# no LLM call) with a slow send and an immediate http.disconnect, then checks that the
+# admission counters are back to zero and that the same message is admitted again.
+# Exits non-zero on a leak.
+#
+#   python benchmarks/check_stream_disconnect.py --requests 5
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+from load_test import ROOT, SESSION_SECRET, prepare_workdir  # noqa: E402
+
+
+def stream_scope(body):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/chat/stream",
+        "raw_path": b"/chat/stream",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-type", b"application/x-www-form-urlencoded"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+
+
+# One request whose client is gone as soon as the request body has been read
+async def disconnecting_request(app, message):
+    body = f"message={message}".encode()
+    messages = [{"type": "http.request", "body": body, "more_body": False}, {"type": "http.disconnect"}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(event):
+        # A slow client: the disconnect is seen before the body is iterated
+        await asyncio.sleep(0.05)
+
+    try:
+        await asyncio.wait_for(app(stream_scope(body), receive, send), 5)
+    except Exception as e:
+        print(f"request ended with {e!r}")
+
+
+async def check(requests):
+    import main
+
+    for _ in range(requests):
+        await disconnecting_request(main.app, "hello")
+    await asyncio.sleep(0.1)
+    stats = main.admission.stats()
+    leaked = main.admission.inflight(0, "hello") is not None
+    print(f"admission after {requests} disconnected streams: {stats}, in-flight ticket left: {leaked}")
+    return stats["pending"] == 0 and stats["users"] == 0 and not leaked
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="disconnect-check-")
+    prepare_workdir(workdir, users=1)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'load.db')}",
+        "SESSION_SECRET": SESSION_SECRET,
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "MEDICAL_TERMS_PATH": os.path.join(ROOT, "medical_term.txt"),
+        "GROQ_API_URL": "http://127.0.0.1:9/openai/v1/chat/completions",
+        "CPU_EXECUTOR": "inline",
+    })
+    os.chdir(workdir)
+    ok = asyncio.run(check(args.requests))
+    print("OK" if ok else "LEAK: admission slot not released")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+# End-to-end load test: starts the mock LLM (mock_groq.py) and the app under uvicorn
+# against a fresh SQLite database, then drives /chat (or /chat/stream), /, /dashboard and
+# /clear_chat with N simulated users whose messages are built from medical_term.txt.
+# Prints one JSON document (RPS, latency percentiles per endpoint, status counts, memory
+# per worker, mock LLM stats, git commit) so runs can be compared across commits.
+#
+#   python benchmarks/load_test.py --users 50 --duration 30 --workers 2 --llm-latency 0.3 \
+#       --llm-error-rate 0.05 --llm-error-status 429 401 --llm-empty-rate 0.02 --output run.json
+#   python benchmarks/load_test.py --users 20 --stream --env RESPONSE_CACHE_SEMANTIC=1
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import httpx
+from itsdangerous import TimestampSigner
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SESSION_SECRET = "load-test"
+
+QUESTION_TEMPLATES = [
+    "I have {a}, what could be causing it?",
+    "I've had {a} and {b} for three days, should I be worried?",
+    "What is the usual treatment for {a}?",
+    "Is {a} serious?",
+    "My child has {a} since yesterday",
+    "Can {a} be related to {b}?",
+]
+SMALL_TALK = [
+    "hello there",
+    "thanks, that was helpful",
+    "what's the weather like today",
+    "can you recommend a movie",
+]
+
+# Used when the repo has no templates/ directory (it is not part of the checkout)
+STAND_IN_TEMPLATES = {
+    "index.html": "<html><body>{% for m in chat_history %}<div class=\"{{ 'user' if m.user else 'bot' }}\">"
+                  "{% if m.user %}{{ m.text }}{% else %}{{ m.text|safe }}{% endif %}</div>{% endfor %}</body></html>",
+    "dashboard.html": "<html><body>{% for c in chat_history %}<div>{{ c.message }}</div><div>{{ c.response|safe }}</div>"
+                      "{% endfor %}</body></html>",
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def load_terms():
+    with open(os.path.join(ROOT, "medical_term.txt"), encoding="utf-8") as f:
+        return sorted({line.strip() for line in f if line.strip()})
+
+
+class MessageMix:
+    def __init__(self, terms, small_talk_rate, repeat_rate, rng):
+        self.terms = terms
+        self.small_talk_rate = small_talk_rate
+        self.repeat_rate = repeat_rate
+        self.rng = rng
+        self.asked = []
+
+    def next(self):
+        if self.asked and self.rng.random() < self.repeat_rate:
+            return self.rng.choice(self.asked)
+        if self.rng.random() < self.small_talk_rate:
+            return self.rng.choice(SMALL_TALK)
+        a, b = self.rng.sample(self.terms, 2)
+        message = self.rng.choice(QUESTION_TEMPLATES).format(a=a, b=b)
+        self.asked.append(message)
+        return message
+
+
+# Starlette SessionMiddleware cookie for a logged-in user
+def session_cookie(user_id):
+    data = base64.b64encode(json.dumps({"user": {"id": user_id, "username": f"load{user_id}"}}).encode())
+    return TimestampSigner(SESSION_SECRET).sign(data).decode()
+
+
+def prepare_workdir(workdir, users):
+    for name in ("static", "logs", "templates"):
+        os.makedirs(os.path.join(workdir, name), exist_ok=True)
+    if os.path.isdir(os.path.join(ROOT, "templates")):
+        shutil.rmtree(os.path.join(workdir, "templates"))
+        shutil.copytree(os.path.join(ROOT, "templates"), os.path.join(workdir, "templates"))
+    else:
+        for name, source in STAND_IN_TEMPLATES.items():
+            with open(os.path.join(workdir, "templates", name), "w", encoding="utf-8") as f:
+                f.write(source)
+
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from base import Base
+    from models import User
+
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'load.db')}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(
+            User(id=i, email=f"load{i}@example.com", username=f"load{i}", hashed_password="x") for i in range(1, users + 1)
+        )
+        session.commit()
+    engine.dispose()
+
+
+def start_mock(args, port, log):
+    cmd = [
+        sys.executable, os.path.join(ROOT, "benchmarks", "mock_groq.py"), "--port", str(port),
+        "--latency", str(args.llm_latency), "--jitter", str(args.llm_jitter), "--token-delay", str(args.llm_token_delay),
+        "--error-rate", str(args.llm_error_rate), "--empty-rate", str(args.llm_empty_rate),
+        "--error-status", *[str(status) for status in args.llm_error_status],
+    ]
+    return subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+
+
+def start_app(args, workdir, port, mock_port, log):
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'load.db')}",
+        "GROQ_API_URL": f"http://127.0.0.1:{mock_port}/openai/v1/chat/completions",
+        "GROQ_API_KEY": "load-test",
+        "SESSION_SECRET": SESSION_SECRET,
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "MEDICAL_TERMS_PATH": os.path.join(ROOT, "medical_term.txt"),
+        "NLP_PRELOAD": "1",
+    }
+    env.setdefault("NLP_CACHE_DIR", os.path.join(ROOT, ".cache"))
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    cmd = [
+        sys.executable, "-m", "uvicorn", "main:app", "--app-dir", ROOT, "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    return subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url, process, timeout):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+# The uvicorn process itself with --workers 1, otherwise its worker children
+def worker_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        children = []
+    # Workers are multiprocessing spawn children (skip the resource tracker)
+    workers = [child for child in children if "spawn_main" in cmdline(child)]
+    return workers or [pid]
+
+
+def cmdline(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode(errors="replace")
+    except OSError:
+        return ""
+
+
+async def sample_memory(pid, samples, stop):
+    while not stop.is_set():
+        for worker in worker_pids(pid):
+            rss = rss_kb(worker)
+            if rss is not None:
+                samples[worker].append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def consume_stream(response):
+    async for _ in response.aiter_bytes():
+        pass
+
+
+async def simulated_user(user_id, base_url, args, deadline, results, rng, terms):
+    mix = MessageMix(terms, args.small_talk_rate, args.repeat_rate, rng)
+    actions = ["chat", "root", "dashboard", "clear_chat"]
+    weights = [args.chat_weight, args.root_weight, args.dashboard_weight, args.clear_weight]
+    cookies = {"session": session_cookie(user_id)}
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, timeout=args.timeout) as client:
+        while time.monotonic() < deadline:
+            action = rng.choices(actions, weights)[0]
+            start = time.perf_counter()
+            try:
+                if action == "chat" and args.stream:
+                    async with client.stream("POST", "/chat/stream", data={"message": mix.next()}) as response:
+                        await consume_stream(response)
+                    endpoint = "/chat/stream"
+                elif action == "chat":
+                    response = await client.post("/chat", data={"message": mix.next()})
+                    endpoint = "/chat"
+                elif action == "root":
+                    response = await client.get("/")
+                    endpoint = "/"
+                elif action == "dashboard":
+                    response = await client.get("/dashboard")
+                    endpoint = "/dashboard"
+                else:
+                    response = await client.post("/clear_chat")
+                    endpoint = "/clear_chat"
+                status = response.status_code
+            except httpx.HTTPError as e:
+                endpoint = {"chat": "/chat/stream" if args.stream else "/chat"}.get(action, action)
+                status = type(e).__name__
+            results.append((endpoint, status, time.perf_counter() - start))
+            if args.think_time:
+                await asyncio.sleep(rng.uniform(0, 2 * args.think_time))
+
+
+def summarize(results, elapsed):
+    by_endpoint = defaultdict(list)
+    statuses = defaultdict(Counter)
+    for endpoint, status, seconds in results:
+        by_endpoint[endpoint].append(seconds * 1000)
+        statuses[endpoint][str(status)] += 1
+    endpoints = {}
+    for endpoint, latencies in sorted(by_endpoint.items()):
+        latencies.sort()
+        endpoints[endpoint] = {
+            "requests": len(latencies),
+            "rps": len(latencies) / elapsed,
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1],
+            "status": dict(statuses[endpoint]),
+        }
+    errors = sum(
+        count for counter in statuses.values() for status, count in counter.items()
+        if not status.isdigit() or int(status) >= 400
+    )
+    return {"requests": len(results), "rps": len(results) / elapsed, "errors": errors, "endpoints": endpoints}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    prepare_workdir(workdir, args.users)
+    mock_port, app_port = free_port(), free_port()
+    mock_log = open(os.path.join(workdir, "mock.log"), "w")
+    app_log = open(os.path.join(workdir, "server.log"), "w")
+    mock = start_mock(args, mock_port, mock_log)
+    app = start_app(args, workdir, app_port, mock_port, app_log)
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        await wait_ready(f"http://127.0.0.1:{mock_port}/stats", mock, 30)
+        await wait_ready(f"{base_url}/metrics", app, args.startup_timeout)
+        idle = {pid: rss_kb(pid) for pid in worker_pids(app.pid)}
+
+        results = []
+        memory = defaultdict(list)
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_memory(app.pid, memory, stop))
+        terms = load_terms()
+        rng = random.Random(args.seed)
+        deadline = time.monotonic() + args.duration
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            simulated_user(user_id, base_url, args, deadline, results, random.Random(rng.random()), terms)
+            for user_id in range(1, args.users + 1)
+        ))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await sampler
+
+        async with httpx.AsyncClient() as client:
+            llm = (await client.get(f"http://127.0.0.1:{mock_port}/stats")).json()
+        report = {
+            "commit": git_commit(),
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "duration_s": elapsed,
+            **summarize(results, elapsed),
+            "memory": {
+                str(pid): {
+                    "idle_rss_mb": (idle.get(pid) or 0) / 1024,
+                    "peak_rss_mb": max(samples) / 1024,
+                    "final_rss_mb": samples[-1] / 1024,
+                }
+                for pid, samples in memory.items() if samples
+            },
+            "llm": {key: llm[key] for key in ("requests", "errors", "empty")},
+            "workdir": workdir,
+        }
+    finally:
+        app.terminate()
+        mock.terminate()
+        app.wait(timeout=30)
+        mock.wait(timeout=30)
+        mock_log.close()
+        app_log.close()
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+        report["workdir"] = None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--stream", action="store_true", help="send chat messages to /chat/stream instead of /chat")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a user's requests (s)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--chat-weight", type=float, default=6)
+    parser.add_argument("--root-weight", type=float, default=2)
+    parser.add_argument("--dashboard-weight", type=float, default=1.5)
+    parser.add_argument("--clear-weight", type=float, default=0.5)
+    parser.add_argument("--small-talk-rate", type=float, default=0.1, help="share of non-medical messages")
+    parser.add_argument("--repeat-rate", type=float, default=0.1, help="share of messages repeating an earlier question")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-jitter", type=float, default=0.0)
+    parser.add_argument("--llm-token-delay", type=float, default=0.005)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-error-status", type=int, nargs="+", default=[429])
+    parser.add_argument("--llm-empty-rate", type=float, default=0.0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app environment")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--keep", action="store_true", help="keep the work directory (database, logs)")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Local stub of the Groq /openai/v1/chat/completions contract.
+# Errors are drawn from --error-status (e.g. 429 401) at --error-rate; --empty-rate
+# returns a completion with empty content instead; --slow-rate adds latency spikes.
+#
+#   python benchmarks/mock_groq.py --port 8001 --latency 0.5 --error-rate 0.1 --error-status 429 401
+#   GROQ_API_URL=http://127.0.0.1:8001/openai/v1/chat/completions uvicorn main:app
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI()
+
+config = {
+    "latency": 0.2,
+    "jitter": 0.0,
+    "error_rate": 0.0,
+    "error_status": [429],
+    "empty_rate": 0.0,
+    "slow_rate": 0.0,
+    "slow_latency": 2.0,
+    "retry_after": 1,
+    "token_delay": 0.01,
+}
+
+stats = {"requests": 0, "errors": 0, "empty": 0}
+
+RESPONSE_HTML = (
+    "<p>I'm sorry you're feeling this way.</p>"
+    "<h3>Possible Causes:</h3>"
+    "<ul><li><strong>Dehydration</strong></li><li><strong>Viral infection</strong></li></ul>"
+    "<p>This information is for general guidance only. Always consult a healthcare professional "
+    "for personalized advice, diagnosis, or treatment.</p>"
+)
+
+
+def completion_body(model, content):
+    return {
+        "id": f"chatcmpl-mock-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+async def stream_chunks(model, content):
+    # Split into small pieces so tags and words straddle chunk boundaries like real deltas
+    for piece in re.findall(r".{1,7}", content, re.S):
+        chunk = {
+            "id": f"chatcmpl-mock-{stats['requests']}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(config["token_delay"])
+    yield "data: [DONE]\n\n"
+
+
+def error_response():
+    status = random.choice(config["error_status"])
+    headers = {"Retry-After": str(config["retry_after"])} if status in (429, 503) else {}
+    return JSONResponse({"error": {"message": "mock error", "type": "mock", "code": status}}, status_code=status, headers=headers)
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    stats["requests"] += 1
+    latency = config["slow_latency"] if random.random() < config["slow_rate"] else config["latency"]
+    await asyncio.sleep(latency + random.uniform(0, config["jitter"]))
+    if random.random() < config["error_rate"]:
+        stats["errors"] += 1
+        return error_response()
+    content = RESPONSE_HTML
+    if random.random() < config["empty_rate"]:
+        stats["empty"] += 1
+        content = ""
+    if payload.get("stream"):
+        return StreamingResponse(stream_chunks(payload.get("model", "mock"), content), media_type="text/event-stream")
+    return completion_body(payload.get("model", "mock"), content)
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, **config}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=config["latency"])
+    parser.add_argument("--jitter", type=float, default=config["jitter"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"])
+    parser.add_argument("--error-status", type=int, nargs="+", default=config["error_status"])
+    parser.add_argument("--empty-rate", type=float, default=config["empty_rate"])
+    parser.add_argument("--slow-rate", type=float, default=config["slow_rate"], help="share of requests taking --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=config["slow_latency"])
+    parser.add_argument("--retry-after", type=int, default=config["retry_after"])
+    parser.add_argument("--token-delay", type=float, default=config["token_delay"])
+    args = parser.parse_args()
+    config.update(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        empty_rate=args.empty_rate,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        retry_after=args.retry_after,
+        token_delay=args.token_delay,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,47 @@
 import os
 from dotenv import load_dotenv
-import requests
-import spacy
+import httpx
 import logging
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from models import Chat
-import bleach
-
-# Configure logging to file and console
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s',
-    handlers=[
-        logging.FileHandler("chatbot.log"),
-        logging.StreamHandler()
-    ]
-)
-
-
-nlp = spacy.load("en_core_web_md")
-
-# Load medical terms for similarity checking
-def load_medical_terms(file_path):
-    try:
-        with open(file_path, 'r') as file:
-            return [nlp(line.strip()) for line in file.readlines() if line.strip()]
-    except Exception as e:
-        logging.error(f"Error loading medical terms: {e}")
-        return []
-
-core_terms = load_medical_terms('medical_term.txt')
-
-# Groq API Configuration
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-# =
-GROQ_HEADERS = {
-    "Authorization": f"Bearer {GROQ_API_KEY}",
-    "Content-Type": "application/json"
-}
+from history import fetch_recent_turns, fetch_history_version
+from database import engine
+from write_buffer import ChatWriteBuffer, merge_pending
+from nlp_model import warm
+from cpu_executor import CPUExecutor, fallback_terms
+from llm_router import LLMRouter, AllBackendsFailed, EmptyCompletion
+from fallback import format_medical_response
+from context_cache import ContextCache
+from prompt_builder import PromptBuilder
+from response_cache import ResponseCache
+import time
+from log_config import setup_logging
+from metrics import metrics, timed
+
+# Configure logging to file and console (queued, written by a background thread)
+setup_logging()
+
+
+# spaCy and the medical term vectors load lazily on first use (see nlp_model.py).
+# NLP_PRELOAD=1 loads them at import instead, e.g. so a pre-forking server shares them.
+if os.getenv("NLP_PRELOAD", "0") == "1":
+    warm()
+
+# Recent turns per user, kept in process to avoid a DB round trip per message
+context_cache = ContextCache.from_env()
+
+# Responses for repeated context-free questions
+response_cache = ResponseCache.from_env()
+
+# Opt-in write-behind persistence of chat turns (WRITE_BEHIND=1)
+chat_writer = ChatWriteBuffer.from_env(engine)
+
+# spaCy classification and HTML sanitization run here instead of on the event loop
+# (CPU_EXECUTOR=inline|thread|process, CPU_WORKERS, NLP_BATCH_*)
+cpu_executor = CPUExecutor.from_env()
+
+# LLM backends: LLM_BACKENDS (JSON list of OpenAI-compatible endpoints) or the single
+# Groq endpoint from GROQ_API_URL/GROQ_API_KEY; breakers and hedging from LLM_* env
+llm_router = LLMRouter.from_env()
 
 #prompt for Groq
 SYSTEM_PROMPT = (
@@ -59,39 +61,6 @@ SYSTEM_PROMPT = (
     "- Do NOT provide vague or identical responses for different symptoms.\n"
 )
 
-#formatting for medical queries
-# def format_medical_response(query):
-#     return f"""
-#     <p><strong>I'm here to assist you with your health concern:</strong> {query}</p>
-    
-#     <h3>Possible Causes:</h3>
-#     <ul>
-#         <li><strong>Tension or stress</strong></li>
-#         <li><strong>Dehydration</strong></li>
-#         <li><strong>Fatigue or lack of sleep</strong></li>
-#         <li><strong>Infections</strong> (e.g., cold, flu)</li>
-#         <li><strong>Environmental factors</strong> (e.g., allergens, weather changes)</li>
-#         <li><strong>Underlying medical conditions</strong> (e.g., chronic conditions)</li>
-#     </ul>
-    
-#     <h3>Common Symptoms to Look Out For:</h3>
-#     <ul>
-#         <li>How long have you been experiencing these symptoms?</li>
-#         <li>Do you feel any other related symptoms (e.g., fever, nausea, fatigue)?</li>
-#     </ul>
-    
-#     <h3>General Recommendations:</h3>
-#     <ul>
-#         <li><strong>Rest:</strong> Take a break and relax in a quiet, dark space.</li>
-#         <li><strong>Hydrate:</strong> Drink plenty of water or fluids to stay hydrated.</li>
-#         <li><strong>Healthy Eating:</strong> Try to eat balanced meals with sufficient nutrients.</li>
-#         <li><strong>Relaxation:</strong> Use relaxation techniques like deep breathing or meditation.</li>
-#     </ul>
-    
-#     <p><strong>Disclaimer:</strong> These are general suggestions. Always consult with a healthcare professional for personalized medical advice, diagnosis, or treatment.</p>
-    
-#     <p>Let me know if you need further assistance or have more specific questions!</p>
-#     """
 # Template to format conversation history
 TEMPLATE = '''
 {context}
@@ -99,75 +68,140 @@ User: {question}
 Note: The user is seeking help for a medical concern. Please analyze the unique condition mentioned and tailor your advice accordingly.
 '''
 
+prompt_builder = PromptBuilder.from_env(TEMPLATE)
+
+
+def build_messages(prompt):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
 
-# Call Groq API with prompt
-def call_groq_model(prompt):
+def fallback_reason(error):
+    if isinstance(error, AllBackendsFailed):
+        error = error.last_error
+    if isinstance(error, EmptyCompletion):
+        return "empty"
+    if isinstance(error, httpx.HTTPStatusError):
+        return str(error.response.status_code) if error.response.status_code in (401, 429) else "http_error"
+    return "error"
+
+# Ask the LLM backends for a completion; None when all of them failed
+async def call_groq_model(prompt):
     try:
-        payload = {
-            "model": "llama3-70b-8192",
-            "messages": [
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7
-        }
-        response = requests.post(GROQ_API_URL, headers=GROQ_HEADERS, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        content = data["choices"][0]["message"]["content"].strip()
-        if not content:
-            logging.warning("Groq API returned empty content.")
-            return None  # Trigger fallback
-        return content
-    except requests.exceptions.HTTPError as e:
-        logging.error(f"Groq API HTTP error: {e}, Response: {e.response.text if e.response else 'No response'}")
-        if e.response.status_code == 401:
-            return None  # Trigger fallback for auth issues
-        elif e.response.status_code == 429:
-            logging.warning("Groq API rate limit exceeded.")
-            return None  # Trigger fallback for rate limits
-        return None  # Trigger fallback for other HTTP errors
+        with timed("llm"):
+            return await llm_router.chat_completion(build_messages(prompt), temperature=0.7)
     except Exception as e:
-        logging.error(f"Groq API general error: {e}")
-        return None  # Trigger fallback
+        reason = fallback_reason(e)
+        if reason == "429":
+            logging.warning("LLM rate limit exceeded.")
+        logging.error("LLM request failed (%s): %r", reason, e)
+        metrics.inc("llm_fallbacks_total", reason=reason)
+        return None
+
+# Templated answer built from the symptom terms in the input, used when no backend answered
+async def local_fallback(user_input, match):
+    terms = await cpu_executor.run(fallback_terms, user_input, match.term)
+    metrics.inc("llm_local_fallbacks_total")
+    logging.info("Serving local fallback response, terms=%s", terms)
+    return format_medical_response(user_input, terms)
+
+# Find the closest medical term for the input; also returns the input vector for reuse (response cache)
+async def match_medical_terms(user_input, threshold=0.5):
+    with timed("classify"):
+        match, vector = await cpu_executor.classify(user_input, threshold)
+    logging.info("Medical term match: term=%r, score=%.3f, medical=%s", match.term, match.score, match.is_medical)
+    return match, vector
 
 # Determine if input is medical-related
-def is_medical_question(user_input, threshold=0.5):
-    if not core_terms:
-        logging.warning("Medical terms list is empty.")
-        return False
-    user_doc = nlp(user_input.lower())
-    return any(user_doc.similarity(term_doc) > threshold for term_doc in core_terms)
-
-# Maintain conversation context in database
-async def update_context(db: AsyncSession, user_id: int, user_input: str, response: str, max_turns: int = 5):
-    result = await db.execute(
-        select(Chat).where(Chat.user_id == user_id).order_by(Chat.timestamp.desc()).limit(max_turns)
+async def is_medical_question(user_input, threshold=0.5):
+    match, _ = await match_medical_terms(user_input, threshold)
+    return match.is_medical
+
+# Recent (message, response) turns from the context cache, loading from the database on a miss.
+# db is a primary session; the cached turns are checked against its current history version
+# because another worker may have stored a turn or cleared the history.
+async def get_recent_turns(db: AsyncSession, user_id: int, max_turns: int = 5):
+    version = await fetch_history_version(db, user_id) if context_cache.verify else None
+    turns = context_cache.get(user_id, version)
+    if turns is None:
+        context_cache.begin_load(user_id)
+        with timed("context_load"):
+            chats = await fetch_recent_turns(db, user_id, context_cache.max_turns)
+        chats = merge_pending(chats, chat_writer.pending_for(user_id))[-context_cache.max_turns:]
+        turns = [(chat.message, chat.response) for chat in chats]
+        context_cache.fill(user_id, turns, version)
+    return turns[-max_turns:] if max_turns else []
+
+# Pack recent turns and the question into the prompt token budget (PROMPT_TOKEN_BUDGET)
+async def build_prompt(db: AsyncSession, user_id: int, user_input: str):
+    turns = await get_recent_turns(db, user_id, context_cache.max_turns)
+    with timed("prompt"):
+        prompt = prompt_builder.build(turns, user_input)
+    metrics.observe("prompt_tokens", prompt.tokens)
+    logging.info(
+        "Prompt tokens: total=%d, context=%d, question=%d, turns included=%d, truncated=%d, dropped=%d",
+        prompt.tokens, prompt.context_tokens, prompt.question_tokens,
+        prompt.turns_included, prompt.turns_truncated, prompt.turns_dropped
     )
-    chats = result.scalars().all()
-    context_lines = []
-    for chat in reversed(chats):
-        context_lines.append(f"User: {chat.message}")
-        context_lines.append(f"AI: {chat.response}")
-    context_lines.append(f"User: {user_input}")
-    context_lines.append(f"AI: {response}")
-    return '\n'.join(context_lines)
+    return prompt.text, turns
+
+# Classify the input; for medical questions return (prompt, turns, input vector, term match), otherwise None
+async def prepare_chat(db: AsyncSession, user_id: int, user_input: str):
+    match, vector = await match_medical_terms(user_input)
+    if not match.is_medical:
+        return None
+    prompt_input, turns = await build_prompt(db, user_id, user_input)
+    return prompt_input, turns, vector, match
 
 # Main chat handler
 async def handle_chat(user_id: int, user_input: str, db: AsyncSession):
     if not user_input.strip():
         return "Please enter a valid message."
-    if is_medical_question(user_input):
-        context = await update_context(db, user_id, user_input, "", max_turns=5)
-        prompt_input = TEMPLATE.format(context=context, question=user_input)
-        response = call_groq_model(prompt_input)
-        # if not response or "Sorry" in response:
-                # response = format_medical_response(user_input)
-
-        response = bleach.clean(response, tags=['p', 'ul', 'li', 'h3', 'strong', '**', '*'], attributes={})
-        await update_context(db, user_id, user_input, response, max_turns=5)
+    prepared = await prepare_chat(db, user_id, user_input)
+    if prepared:
+        prompt_input, turns, vector, match = prepared
+        cached = response_cache.get(user_input, turns, vector)
+        if cached:
+            return cached
+        start = time.perf_counter()
+        response = await call_groq_model(prompt_input)
+        if not response:
+            return await local_fallback(user_input, match)
+
+        # Raw model output; sanitized once when the turn is stored
+        response_cache.put(user_input, turns, response, vector, latency=time.perf_counter() - start)
         return response
-    # return format_medical_response(user_input)
+
+# Streaming chat handler: yields raw model deltas, nothing for empty or non-medical input
+async def stream_chat(user_id: int, user_input: str, db: AsyncSession):
+    if not user_input.strip():
+        return
+    prepared = await prepare_chat(db, user_id, user_input)
+    if not prepared:
+        return
+    prompt_input, turns, vector, match = prepared
+    cached = response_cache.get(user_input, turns, vector)
+    if cached:
+        yield cached
+        return
+    start = time.perf_counter()
+    parts = []
+    try:
+        async for delta in llm_router.stream_chat_completion(build_messages(prompt_input), temperature=0.7):
+            if not parts:
+                metrics.observe("stage_duration_seconds", time.perf_counter() - start, stage="llm_first_token")
+            parts.append(delta)
+            yield delta
+    except Exception as e:
+        reason = fallback_reason(e)
+        logging.error("LLM streaming failed (%s): %r", reason, e)
+        metrics.inc("llm_fallbacks_total", reason=reason)
+        if not parts:
+            yield await local_fallback(user_input, match)
+        return
+    metrics.observe("stage_duration_seconds", time.perf_counter() - start, stage="llm_stream")
+    response_cache.put(user_input, turns, ''.join(parts).strip(), vector, latency=time.perf_counter() - start)
 
 def clear_chat():
     return "Chat history has been cleared. How can I assist you now?"
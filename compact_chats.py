@@ -0,0 +1,135 @@
+from sqlalchemy import delete, insert, or_, select
+from database import engine
+from history import history_version_bump
+from models import Chat, ChatArchive
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+import zlib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COMPACTION_BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", "500"))
+COMPACTION_PAUSE = float(os.getenv("COMPACTION_PAUSE", "0.05"))
+# Also archive visible chats older than this many days (0 = only soft-deleted chats)
+COMPACTION_MAX_AGE_DAYS = int(os.getenv("COMPACTION_MAX_AGE_DAYS", "0"))
+
+def pack_chat(message, response):
+    return zlib.compress(json.dumps({"message": message, "response": response}).encode("utf-8"))
+
+def unpack_chat(payload):
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+def compactable(max_age_days):
+    condition = Chat.is_deleted == True
+    if max_age_days:
+        condition = or_(condition, Chat.timestamp < datetime.now() - timedelta(days=max_age_days))
+    return condition
+
+# Move one batch of soft-deleted (and, with max_age_days, aged) chats into chats_archive.
+# Candidates are picked with a plain, non-locking read (served by ix_chats_deleted_id for
+# soft-deleted rows); only those rows are then locked, by primary key, so the locking read
+# never holds range locks that would block /chat inserts. Insert and delete share one
+# short transaction, so a row is never lost or archived twice.
+# Returns the user ids whose visible history changed (aged rows only).
+async def compact_batch(engine, batch_size, max_age_days=0):
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            select(Chat.id).where(compactable(max_age_days)).order_by(Chat.id).limit(batch_size)
+        )
+        candidate_ids = result.scalars().all()
+    if not candidate_ids:
+        return 0, set()
+    async with engine.begin() as conn:
+        # Re-check the condition: a candidate may have changed since it was read
+        result = await conn.execute(
+            select(Chat.id, Chat.user_id, Chat.message, Chat.response, Chat.timestamp, Chat.is_deleted)
+            .where(Chat.id.in_(candidate_ids), compactable(max_age_days))
+            .with_for_update(skip_locked=True)
+        )
+        rows = result.all()
+        if not rows:
+            return 0, set()
+        archived_at = datetime.now()
+        await conn.execute(insert(ChatArchive), [
+            {
+                "id": row.id,
+                "user_id": row.user_id,
+                "timestamp": row.timestamp,
+                "is_deleted": bool(row.is_deleted),
+                "archived_at": archived_at,
+                "payload": pack_chat(row.message, row.response),
+            }
+            for row in rows
+        ])
+        await conn.execute(delete(Chat).where(Chat.id.in_([row.id for row in rows])))
+        changed_users = {row.user_id for row in rows if not row.is_deleted}
+        if changed_users:
+            await conn.execute(history_version_bump(changed_users))
+    return len(rows), changed_users
+
+# Run batches until nothing is left (or max_batches), pausing between them so the
+# live table is never locked for long. on_history_changed(user_id) is called for users
+# whose visible chats were archived, e.g. to invalidate in-process caches.
+async def compact_chats(engine, batch_size=COMPACTION_BATCH_SIZE, max_age_days=COMPACTION_MAX_AGE_DAYS,
+                        pause=COMPACTION_PAUSE, max_batches=None, on_history_changed=None):
+    start = time.perf_counter()
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        count, changed_users = await compact_batch(engine, batch_size, max_age_days)
+        if not count:
+            break
+        moved += count
+        batches += 1
+        if on_history_changed:
+            for user_id in changed_users:
+                on_history_changed(user_id)
+        if count < batch_size:
+            break
+        await asyncio.sleep(pause)
+    elapsed = time.perf_counter() - start
+    stats = {"rows": moved, "batches": batches, "seconds": elapsed, "rows_per_second": moved / elapsed if elapsed else 0.0}
+    if moved:
+        logging.info("Compacted chats: %d rows in %d batches, %.1fs (%.0f rows/s)", moved, batches, elapsed, stats["rows_per_second"])
+    return stats
+
+# In-process periodic compaction (COMPACTION_INTERVAL seconds), started by main.py
+async def compact_periodically(engine, interval, on_history_changed=None):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await compact_chats(engine, on_history_changed=on_history_changed)
+        except Exception as e:
+            logging.error("Error compacting chats: %s", e)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Move soft-deleted (and optionally aged) chats into chats_archive.")
+    parser.add_argument("--batch-size", type=int, default=COMPACTION_BATCH_SIZE)
+    parser.add_argument("--max-age-days", type=int, default=COMPACTION_MAX_AGE_DAYS)
+    parser.add_argument("--pause", type=float, default=COMPACTION_PAUSE, help="seconds to sleep between batches")
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args()
+    try:
+        logging.info("Compacting chats...")
+        stats = await compact_chats(engine, args.batch_size, args.max_age_days, args.pause, args.max_batches)
+        logging.info("Compaction complete: %s", stats)
+    except Exception as e:
+        logging.error("Error compacting chats: %s", e)
+        raise
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(message)s',
+        handlers=[logging.FileHandler("compact_chats.log"), logging.StreamHandler()]
+    )
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+import os
+import sys
+import threading
+from collections import OrderedDict, deque
+
+
+def turn_size(message, response):
+    return sys.getsizeof(message) + sys.getsizeof(response)
+
+
+# In-process cache of each user's most recent (message, response) turns.
+# Ring buffer per user, LRU-evicted by user count and by an approximate memory budget.
+# Filled from the DB on a miss, updated write-through after commits, invalidated on clear.
+# Entries carry the history version (users.history_version, see history.fetch_history_version)
+# they were loaded at; get() with the current version drops entries changed by other workers.
+class ContextCache:
+    def __init__(self, max_users=10000, max_turns=10, max_bytes=64 * 1024 * 1024, verify=True):
+        self.max_users = max_users
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.verify = verify
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._versions = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_users=int(os.getenv("CONTEXT_CACHE_MAX_USERS", "10000")),
+            max_turns=int(os.getenv("CONTEXT_CACHE_TURNS", "10")),
+            max_bytes=int(os.getenv("CONTEXT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            verify=os.getenv("CONTEXT_CACHE_VERIFY", "1") == "1",
+        )
+
+    # Cached turns oldest-first, or None on a miss or when version (if given) differs from the cached one
+    def get(self, user_id, version=None):
+        with self._lock:
+            turns = self._entries.get(user_id)
+            if turns is not None and version is not None and self._versions.get(user_id) != version:
+                self._remove(user_id)
+                self.stale += 1
+                turns = None
+            if turns is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return list(turns)
+
+    # Call before reading from the DB so a write racing with the load can discard the stale fill
+    def begin_load(self, user_id):
+        with self._lock:
+            self._loading[user_id] = False
+
+    def fill(self, user_id, turns, version=None):
+        with self._lock:
+            if self._loading.pop(user_id, True):
+                return
+            self._store(user_id, deque(turns, maxlen=self.max_turns))
+            if user_id in self._entries:
+                self._versions[user_id] = version
+
+    # Write-through after a committed turn; users not in the cache are loaded on their next miss.
+    # version is the history version right after this turn's insert (None while write-behind
+    # buffered). It is adopted only if it directly follows the cached one: any other gap means
+    # another worker changed the history too, and the entry is reloaded on the next get().
+    def append(self, user_id, message, response, version=None):
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = True
+            turns = self._entries.get(user_id)
+            if turns is None:
+                return
+            cached = self._versions.get(user_id)
+            turns.append((message, response))
+            self._store(user_id, turns)
+            if user_id in self._entries:
+                if cached is not None and version == cached + 1:
+                    cached = version
+                self._versions[user_id] = cached
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = True
+            self._remove(user_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "stale": self.stale,
+            }
+
+    def _store(self, user_id, turns):
+        self._remove(user_id)
+        size = sum(turn_size(message, response) for message, response in turns)
+        if size > self.max_bytes:
+            return
+        self._entries[user_id] = turns
+        self._sizes[user_id] = size
+        self.total_bytes += size
+        while len(self._entries) > self.max_users or self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, user_id):
+        self._versions.pop(user_id, None)
+        if self._entries.pop(user_id, None) is not None:
+            self.total_bytes -= self._sizes.pop(user_id)
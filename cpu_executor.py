@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+import nlp_model
+from fallback import detect_terms
+from sanitizer import sanitize_html
+
+load_dotenv()
+
+MODES = ("inline", "thread", "process")
+
+
+# Process pool initializer: load spaCy and the term index once per worker
+def warm_worker():
+    nlp_model.warm()
+
+
+# Classify a batch of lowercased texts with one nlp.pipe call; returns (TermMatch, vector) per text
+def classify_batch(texts, thresholds):
+    index = nlp_model.get_term_index()
+    docs = nlp_model.get_nlp().pipe(texts)
+    results = []
+    for doc, threshold in zip(docs, thresholds):
+        results.append((index.best_match(doc.vector, threshold), doc.vector))
+    return results
+
+
+# Symptom terms in text for the local fallback response (needs the term index, so runs in a worker)
+def fallback_terms(text, best_match=None):
+    return detect_terms(text, nlp_model.get_term_index().terms, best_match)
+
+
+# Runs CPU-bound work (spaCy classification, bleach sanitization) off the event loop.
+# mode "inline" runs it on the loop as before, "thread" in a thread pool, "process" in a
+# pool of spawned worker processes that each load the spaCy model at start.
+# In thread mode classification has its own single thread: the shared spaCy pipeline is not
+# documented as thread-safe, and under the GIL more threads would not speed it up.
+# Sanitization uses one bleach Cleaner per thread (see sanitizer.py).
+# Concurrent classify() calls are micro-batched: texts arriving within batch_wait seconds
+# (up to batch_max) go to a worker together and are vectorized with one nlp.pipe call.
+class CPUExecutor:
+    def __init__(self, mode="thread", workers=1, batch_max=32, batch_wait=0.002):
+        if mode not in MODES:
+            raise ValueError(f"Unknown executor mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.batch_max = max(1, batch_max)
+        self.batch_wait = batch_wait
+        self._pool = None
+        self._nlp_pool = None
+        self._queue = []
+        self._timer = None
+        self.batches = 0
+        self.batched_texts = 0
+        self.largest_batch = 0
+        self.sanitized = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            mode=os.getenv("CPU_EXECUTOR", "thread"),
+            workers=int(os.getenv("CPU_WORKERS", "1")),
+            batch_max=int(os.getenv("NLP_BATCH_MAX", "32")),
+            batch_wait=float(os.getenv("NLP_BATCH_WAIT_MS", "2")) / 1000,
+        )
+
+    # Created on first use; process workers are spawned (not forked) so they never
+    # inherit the server's event loop, sockets or logging thread
+    @property
+    def pool(self):
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=warm_worker,
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cpu")
+            logging.info("Started %s CPU executor with %d workers", self.mode, self.workers)
+        return self._pool
+
+    # Where classification runs: the process pool, or one dedicated thread
+    @property
+    def nlp_pool(self):
+        if self.mode == "process":
+            return self.pool
+        if self._nlp_pool is None:
+            self._nlp_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nlp")
+        return self._nlp_pool
+
+    # Load spaCy and the term index where the work runs, before the first request needs them:
+    # the classification thread loads them in thread mode, each process worker runs warm_worker
+    async def start(self):
+        if self.mode == "inline":
+            return
+        loop = asyncio.get_running_loop()
+        if self.mode == "thread":
+            await loop.run_in_executor(self.nlp_pool, nlp_model.warm)
+        else:
+            await asyncio.gather(*(loop.run_in_executor(self.pool, int) for _ in range(self.workers)))
+
+    async def run(self, fn, *args):
+        if self.mode == "inline":
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    # Best medical term match and document vector for text (lowercased here)
+    async def classify(self, text, threshold=0.5):
+        if self.mode == "inline":
+            return classify_batch([text.lower()], [threshold])[0]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((text.lower(), threshold, future))
+        if len(self._queue) >= self.batch_max:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_wait, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue, []
+        if not batch:
+            return
+        self.batches += 1
+        self.batched_texts += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        texts = [text for text, _, _ in batch]
+        thresholds = [threshold for _, threshold, _ in batch]
+        futures = [future for _, _, future in batch]
+        task = asyncio.get_running_loop().run_in_executor(self.nlp_pool, classify_batch, texts, thresholds)
+        task.add_done_callback(lambda done: self._resolve(done, futures))
+
+    @staticmethod
+    def _resolve(done, futures):
+        error = done.exception()
+        for i, future in enumerate(futures):
+            if future.done():
+                # The caller was cancelled while its batch was running
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
+
+    async def sanitize(self, text):
+        self.sanitized += 1
+        return await self.run(sanitize_html, text)
+
+    def shutdown(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for pool in (self._nlp_pool, self._pool):
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+        self._nlp_pool = None
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_texts / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": len(self._queue),
+            "sanitized": self.sanitized,
+        }
@@ -0,0 +1,134 @@
+import html
+import re
+from functools import lru_cache
+
+# Local, templated answers used when no LLM backend is available. Keyed on symptom
+# terms from medical_term.txt; each topic lists common causes and safe self-care steps.
+URGENT_TERMS = {"chest pain", "shortness of breath", "difficulty breathing"}
+
+TOPICS = {
+    "headache": (
+        ["Tension or stress", "Dehydration", "Fatigue or lack of sleep", "Eye strain", "Infections (e.g., cold, flu)"],
+        ["Rest in a quiet, dark space", "Drink plenty of water", "Limit screen time and caffeine"],
+    ),
+    "migraine": (
+        ["Migraine triggers such as stress, bright light or missed meals", "Hormonal changes", "Lack of sleep"],
+        ["Rest in a quiet, dark room", "Keep a diary of possible triggers", "Stay hydrated"],
+    ),
+    "fever": (
+        ["Viral infections (e.g., cold, flu)", "Bacterial infections", "Inflammation"],
+        ["Rest and drink plenty of fluids", "Wear light clothing", "Monitor your temperature regularly"],
+    ),
+    "cough": (
+        ["Common cold or flu", "Allergies", "Irritants such as smoke or dust", "Acid reflux"],
+        ["Drink warm fluids", "Use a humidifier", "Avoid smoke and other irritants"],
+    ),
+    "sore throat": (
+        ["Viral infections", "Strep throat", "Dry air", "Allergies"],
+        ["Gargle with warm salt water", "Drink warm fluids", "Rest your voice"],
+    ),
+    "cold": (
+        ["Common cold viruses"],
+        ["Rest and drink plenty of fluids", "Use saline nasal spray", "Wash your hands often"],
+    ),
+    "flu": (
+        ["Influenza virus"],
+        ["Rest and stay home to avoid spreading it", "Drink plenty of fluids", "Monitor for breathing difficulties"],
+    ),
+    "nausea": (
+        ["Stomach infections", "Food intolerance", "Motion sickness", "Medication side effects"],
+        ["Sip clear fluids slowly", "Eat small, bland meals", "Avoid strong smells and greasy food"],
+    ),
+    "vomiting": (
+        ["Stomach infections", "Food poisoning", "Migraine"],
+        ["Sip small amounts of water or oral rehydration solution", "Rest your stomach before eating bland food"],
+    ),
+    "diarrhea": (
+        ["Stomach infections", "Food poisoning", "Food intolerance"],
+        ["Drink oral rehydration solution", "Eat bland foods", "Wash your hands often"],
+    ),
+    "dizziness": (
+        ["Dehydration", "Low blood pressure", "Inner ear problems", "Low blood sugar"],
+        ["Sit or lie down until it passes", "Drink water", "Stand up slowly"],
+    ),
+    "fatigue": (
+        ["Lack of sleep", "Stress", "Anemia", "Thyroid problems", "Infections"],
+        ["Keep a regular sleep schedule", "Eat balanced meals", "Take short breaks and light exercise"],
+    ),
+    "insomnia": (
+        ["Stress or anxiety", "Irregular sleep schedule", "Caffeine or screen use before bed"],
+        ["Keep a consistent bedtime", "Avoid caffeine late in the day", "Limit screens before sleep"],
+    ),
+    "anxiety": (
+        ["Stress", "Lack of sleep", "Caffeine", "Underlying anxiety disorders"],
+        ["Try slow, deep breathing", "Get regular physical activity", "Talk to someone you trust"],
+    ),
+    "allergy": (
+        ["Pollen, dust or pet dander", "Certain foods", "Insect stings"],
+        ["Avoid known triggers", "Keep windows closed on high-pollen days", "Seek help for swelling or trouble breathing"],
+    ),
+    "pain": (
+        ["Muscle strain or overuse", "Injury", "Inflammation"],
+        ["Rest the affected area", "Apply a cold or warm compress", "Avoid activities that make it worse"],
+    ),
+}
+
+GENERAL_CAUSES = [
+    "Tension or stress",
+    "Dehydration",
+    "Fatigue or lack of sleep",
+    "Infections (e.g., cold, flu)",
+    "Underlying medical conditions",
+]
+GENERAL_ADVICE = ["Rest", "Stay hydrated", "Eat balanced meals", "Note when symptoms started and how they change"]
+
+
+@lru_cache(maxsize=4)
+def terms_pattern(known_terms):
+    alternatives = sorted({term.lower() for term in known_terms}, key=len, reverse=True)
+    return re.compile(r"\b(" + "|".join(re.escape(term) for term in alternatives) + r")\b")
+
+
+# Symptom terms mentioned in the text (whole words, longest match wins), plus the best vector match
+def detect_terms(text, known_terms, best_match=None):
+    found = list(dict.fromkeys(terms_pattern(tuple(known_terms)).findall(text.lower()))) if known_terms else []
+    if best_match and best_match not in found:
+        found.append(best_match)
+    return found
+
+
+def html_list(items):
+    return "<ul>" + "".join(f"<li>{html.escape(item)}</li>" for item in items) + "</ul>"
+
+
+# Templated response for when every LLM backend failed
+def format_medical_response(query, terms=()):
+    topics = [term for term in terms if term in TOPICS][:2]
+    urgent = [term for term in terms if term in URGENT_TERMS]
+    parts = [f"<p><strong>I'm here to assist you with your health concern:</strong> {html.escape(query)}</p>"]
+    if urgent:
+        parts.append(
+            f"<p><strong>{html.escape(urgent[0].capitalize())} can be a sign of a serious condition. "
+            "Please seek immediate medical attention or call your local emergency number.</strong></p>"
+        )
+    if topics:
+        for term in topics:
+            causes, advice = TOPICS[term]
+            parts.append(f"<h3>Possible Causes of {html.escape(term.capitalize())}:</h3>" + html_list(causes))
+            parts.append("<h3>General Recommendations:</h3>" + html_list(advice))
+    else:
+        parts.append("<h3>Possible Causes:</h3>" + html_list(GENERAL_CAUSES))
+        parts.append("<h3>General Recommendations:</h3>" + html_list(GENERAL_ADVICE))
+    parts.append(
+        "<h3>Common Symptoms to Look Out For:</h3>"
+        + html_list([
+            "How long have you been experiencing these symptoms?",
+            "Do you feel any other related symptoms (e.g., fever, nausea, fatigue)?",
+        ])
+    )
+    parts.append(
+        "<p><strong>Disclaimer:</strong> Our assistant is temporarily unavailable, so these are general suggestions. "
+        "This information is for general guidance only. Always consult a healthcare professional for personalized "
+        "advice, diagnosis, or treatment.</p>"
+    )
+    return "".join(parts)
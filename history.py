@@ -0,0 +1,83 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models import Chat, User
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+# Opaque keyset cursor pointing at a chat row: "<timestamp iso>|<id>", base64url encoded
+def encode_cursor(chat: Chat):
+    raw = f"{chat.timestamp.isoformat()}|{chat.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, chat_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(chat_id)
+    except Exception:
+        raise ValueError(f"Invalid history cursor: {cursor!r}")
+
+
+# Most recent visible turns for building the model context (served by ix_chats_user_deleted_timestamp)
+def recent_turns_query(user_id: int, max_turns: int):
+    return (
+        select(Chat)
+        .where(Chat.user_id == user_id, Chat.is_deleted == False)
+        .order_by(Chat.timestamp.desc(), Chat.id.desc())
+        .limit(max_turns)
+    )
+
+
+# Returns the last max_turns visible chats, oldest first
+async def fetch_recent_turns(db: AsyncSession, user_id: int, max_turns: int = 5):
+    result = await db.execute(recent_turns_query(user_id, max_turns))
+    return list(reversed(result.scalars().all()))
+
+
+# Per-user history counter (users.history_version), bumped in the same transaction as every
+# stored turn, clear and archival of visible chats. Per-process caches compare it with the
+# database so that several workers never serve a stale history. A primary key lookup.
+# None for a user without a users row (the guest), whose history is then not verified.
+async def fetch_history_version(db: AsyncSession, user_id: int):
+    result = await db.execute(select(User.history_version).where(User.id == user_id))
+    return result.scalar_one_or_none()
+
+
+# Statement bumping the history version of user_ids; works on sessions and connections
+def history_version_bump(user_ids):
+    users = User.__table__
+    return update(users).where(users.c.id.in_(list(user_ids))).values(history_version=users.c.history_version + 1)
+
+
+def chat_to_dict(chat: Chat):
+    return {
+        "id": chat.id,
+        "message": chat.message,
+        "response": chat.response,
+        "timestamp": chat.timestamp.isoformat(),
+    }
+
+
+# One page of a user's visible history, walking backwards from the cursor.
+# Returns (chats oldest-to-newest, cursor for the next older page or None).
+async def fetch_history_page(db: AsyncSession, user_id: int, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = select(Chat).where(Chat.user_id == user_id, Chat.is_deleted == False)
+    if cursor:
+        timestamp, chat_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Chat.timestamp < timestamp,
+            and_(Chat.timestamp == timestamp, Chat.id < chat_id)
+        ))
+    result = await db.execute(query.order_by(Chat.timestamp.desc(), Chat.id.desc()).limit(limit + 1))
+    chats = result.scalars().all()
+    next_cursor = encode_cursor(chats[limit - 1]) if len(chats) > limit else None
+    return list(reversed(chats[:limit])), next_cursor
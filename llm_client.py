@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+# Parse a Retry-After header (delta-seconds or HTTP-date) into seconds
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+# Async client for OpenAI-compatible chat-completions endpoints (Groq).
+# One pooled httpx connection per process, bounded concurrency and retry with jittered backoff.
+class AsyncLLMClient:
+    def __init__(
+        self,
+        url,
+        api_key,
+        model="llama3-70b-8192",
+        connect_timeout=5.0,
+        read_timeout=60.0,
+        max_retries=3,
+        backoff_base=0.5,
+        backoff_max=8.0,
+        max_concurrency=8,
+        max_connections=20,
+    ):
+        self.url = url
+        self.model = model
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self._client = None
+        self._semaphore = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            url=os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions"),
+            api_key=os.getenv("GROQ_API_KEY"),
+            model=os.getenv("GROQ_MODEL", "llama3-70b-8192"),
+            connect_timeout=float(os.getenv("GROQ_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("GROQ_READ_TIMEOUT", "60")),
+            max_retries=int(os.getenv("GROQ_MAX_RETRIES", "3")),
+            backoff_base=float(os.getenv("GROQ_BACKOFF_BASE", "0.5")),
+            backoff_max=float(os.getenv("GROQ_BACKOFF_MAX", "8")),
+            max_concurrency=int(os.getenv("GROQ_MAX_CONCURRENCY", "8")),
+            max_connections=int(os.getenv("GROQ_MAX_CONNECTIONS", "20")),
+        )
+
+    @property
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def backoff_delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        # Full jitter: uniform over [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    # Send a payload, retrying 429/5xx and transport errors; raises httpx errors once retries run out,
+    # or at once when the server's Retry-After is longer than backoff_max (so callers can fall back).
+    # Streamed responses are returned open and must be closed by the caller.
+    async def send(self, payload, stream=False):
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                request = self.client.build_request("POST", self.url, headers=self.headers, json=payload)
+                response = await self.client.send(request, stream=stream)
+                if response.status_code in RETRY_STATUS_CODES:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                give_up = attempt >= self.max_retries or (retry_after is not None and retry_after > self.backoff_max)
+                if response.status_code not in RETRY_STATUS_CODES or give_up:
+                    if response.is_error and stream:
+                        await response.aread()
+                        await response.aclose()
+                    response.raise_for_status()
+                    return response
+                await response.aclose()
+                logging.warning("LLM API returned %d, retry %d/%d", response.status_code, attempt + 1, self.max_retries)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise
+                logging.warning("LLM API transport error: %r, retry %d/%d", e, attempt + 1, self.max_retries)
+            await asyncio.sleep(self.backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    async def chat_completion(self, messages, temperature=0.7):
+        payload = {"model": self.model, "messages": messages, "temperature": temperature}
+        async with self.semaphore:
+            response = await self.send(payload)
+        data = response.json()
+        return data["choices"][0]["message"]["content"].strip()
+
+    # Yield content deltas from a streamed (SSE) completion as they arrive
+    async def stream_chat_completion(self, messages, temperature=0.7):
+        payload = {"model": self.model, "messages": messages, "temperature": temperature, "stream": True}
+        async with self.semaphore:
+            response = await self.send(payload, stream=True)
+            try:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or []
+                    delta = choices[0].get("delta", {}).get("content") if choices else None
+                    if delta:
+                        yield delta
+            finally:
+                await response.aclose()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+from llm_client import AsyncLLMClient
+
+load_dotenv()
+
+
+# Raised when no backend produced a completion; last_error is the final backend's exception
+class AllBackendsFailed(Exception):
+    def __init__(self, last_error=None):
+        super().__init__(f"All LLM backends failed: {last_error!r}")
+        self.last_error = last_error
+
+
+class EmptyCompletion(Exception):
+    pass
+
+
+# Opens after failure_threshold consecutive failures; after reset_timeout one trial
+# request is let through (half-open), which closes the breaker on success.
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+
+
+# One OpenAI-compatible endpoint behind the router
+class Backend:
+    def __init__(self, name, client, weight=1.0, timeout=30.0, breaker=None, window=200):
+        self.name = name
+        self.client = client
+        self.weight = weight
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+
+    def latency_quantile(self, q):
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+
+    async def chat_completion(self, messages, temperature):
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            content = await asyncio.wait_for(self.client.chat_completion(messages, temperature=temperature), self.timeout)
+            if not content:
+                raise EmptyCompletion(f"{self.name} returned empty content")
+        except asyncio.CancelledError:
+            # Lost a hedge race: not the backend's fault
+            if self.breaker.trial_in_flight:
+                self.breaker.trial_in_flight = False
+            raise
+        except Exception:
+            self.failures += 1
+            self.breaker.record_failure()
+            raise
+        self.latencies.append(time.perf_counter() - start)
+        self.breaker.record_success()
+        return content
+
+    def stats(self):
+        p95 = self.latency_quantile(0.95)
+        return {
+            "state": self.breaker.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "trips": self.breaker.trips,
+            "p95_seconds": p95 if p95 is not None else 0.0,
+        }
+
+
+# Routes chat completions over weighted OpenAI-compatible backends.
+# Backends are tried in a weighted-random order, skipping those with an open circuit breaker.
+# With hedging, if the first backend has not answered within its recent p95 latency
+# (at least hedge_min_delay), the next backend is started as well and the first
+# completion wins. Streams are not hedged; they fail over only before the first delta is
+# sent, and the backend timeout applies to that first delta.
+class LLMRouter:
+    def __init__(self, backends, hedge=True, hedge_quantile=0.95, hedge_min_delay=0.5, hedge_min_samples=20):
+        self.backends = backends
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_env(cls):
+        breaker_failures = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+        breaker_reset = float(os.getenv("LLM_BREAKER_RESET", "30"))
+        config = os.getenv("LLM_BACKENDS")
+        if config:
+            backends = [
+                cls.backend_from_config(entry, breaker_failures, breaker_reset)
+                for entry in json.loads(config)
+            ]
+        else:
+            # Single backend from the GROQ_* settings
+            backends = [Backend(
+                "groq", AsyncLLMClient.from_env(),
+                timeout=float(os.getenv("GROQ_TIMEOUT", "90")),
+                breaker=CircuitBreaker(breaker_failures, breaker_reset),
+            )]
+        return cls(
+            backends,
+            hedge=os.getenv("LLM_HEDGE", "1") == "1",
+            hedge_quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.95")),
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5")),
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+        )
+
+    # One LLM_BACKENDS entry: {"name", "url", "model", "api_key_env", "weight", "timeout",
+    # "max_retries", "max_concurrency"}; only url is required
+    @staticmethod
+    def backend_from_config(entry, breaker_failures=5, breaker_reset=30.0):
+        client = AsyncLLMClient(
+            url=entry["url"],
+            api_key=os.getenv(entry.get("api_key_env", "GROQ_API_KEY")),
+            model=entry.get("model", "llama3-70b-8192"),
+            read_timeout=float(entry.get("timeout", 30)),
+            max_retries=int(entry.get("max_retries", 1)),
+            max_concurrency=int(entry.get("max_concurrency", 8)),
+        )
+        return Backend(
+            entry.get("name", entry["url"]),
+            client,
+            weight=float(entry.get("weight", 1)),
+            timeout=float(entry.get("timeout", 30)),
+            breaker=CircuitBreaker(breaker_failures, breaker_reset),
+        )
+
+    @property
+    def max_concurrency(self):
+        return sum(backend.client.max_concurrency for backend in self.backends)
+
+    # Closed-breaker backends in weighted-random order, then half-open ones for a trial
+    def order(self):
+        candidates = [backend for backend in self.backends if backend.breaker.state != "open"]
+        ordered = []
+        while candidates:
+            backend = random.choices(candidates, weights=[max(b.weight, 1e-6) for b in candidates])[0]
+            candidates.remove(backend)
+            ordered.append(backend)
+        return sorted(ordered, key=lambda backend: backend.breaker.state != "closed")
+
+    def hedge_delay(self, backend):
+        if len(backend.latencies) < self.hedge_min_samples:
+            return max(self.hedge_min_delay, backend.timeout / 2)
+        return max(self.hedge_min_delay, backend.latency_quantile(self.hedge_quantile))
+
+    # Next backend from the queue that its breaker lets through (claims a half-open trial)
+    @staticmethod
+    def take(queue):
+        while queue:
+            backend = queue.pop(0)
+            if backend.breaker.allow():
+                return backend
+        return None
+
+    async def chat_completion(self, messages, temperature=0.7):
+        queue = self.order()
+        last_error = None
+        running = {}
+        hedged = set()
+        try:
+            while True:
+                if not running:
+                    backend = self.take(queue)
+                    if backend is None:
+                        break
+                    running[asyncio.create_task(backend.chat_completion(messages, temperature))] = backend
+                timeout = None
+                if self.hedge and queue and len(running) == 1:
+                    timeout = self.hedge_delay(next(iter(running.values())))
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The request is slower than the backend's p95: race the next backend against it
+                    backend = self.take(queue)
+                    if backend is not None:
+                        self.hedges += 1
+                        logging.info("Hedging LLM request to %s", backend.name)
+                        task = asyncio.create_task(backend.chat_completion(messages, temperature))
+                        running[task] = backend
+                        hedged.add(task)
+                    continue
+                for task in done:
+                    backend = running.pop(task)
+                    try:
+                        content = task.result()
+                    except Exception as e:
+                        last_error = e
+                        logging.warning("LLM backend %s failed: %r", backend.name, e)
+                        continue
+                    if task in hedged:
+                        self.hedge_wins += 1
+                    return content
+        finally:
+            for task in running:
+                task.cancel()
+        raise AllBackendsFailed(last_error)
+
+    async def stream_chat_completion(self, messages, temperature=0.7):
+        last_error = None
+        queue = self.order()
+        while True:
+            backend = self.take(queue)
+            if backend is None:
+                break
+            backend.calls += 1
+            started = False
+            start = time.perf_counter()
+            stream = backend.client.stream_chat_completion(messages, temperature=temperature)
+            try:
+                # backend.timeout bounds the wait for the first delta; later deltas only the read timeout
+                try:
+                    delta = await asyncio.wait_for(anext(stream), backend.timeout)
+                except StopAsyncIteration:
+                    delta = None
+                if delta is not None:
+                    started = True
+                    yield delta
+                    async for delta in stream:
+                        yield delta
+            except Exception as e:
+                backend.failures += 1
+                backend.breaker.record_failure()
+                if started:
+                    raise
+                last_error = e
+                logging.warning("LLM backend %s failed before streaming: %r", backend.name, e)
+                continue
+            except BaseException:
+                # Closed early by the consumer (disconnect, cancellation): not the backend's
+                # fault, but a half-open trial must be released or the breaker never closes
+                backend.breaker.trial_in_flight = False
+                raise
+            finally:
+                await stream.aclose()
+            if not started:
+                backend.failures += 1
+                backend.breaker.record_failure()
+                last_error = EmptyCompletion(f"{backend.name} streamed no content")
+                continue
+            backend.latencies.append(time.perf_counter() - start)
+            backend.breaker.record_success()
+            return
+        raise AllBackendsFailed(last_error)
+
+    async def aclose(self):
+        for backend in self.backends:
+            await backend.client.aclose()
+
+    def stats(self):
+        stats = {"hedges": self.hedges, "hedge_wins": self.hedge_wins}
+        for backend in self.backends:
+            name = re.sub(r"\W+", "_", backend.name)
+            for key, value in backend.stats().items():
+                stats[f"{name}_{key}"] = value
+        return stats
@@ -0,0 +1,214 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.5"))
+# How user messages and bot responses appear in logs: redact | truncate | full
+LOG_BODIES = os.getenv("LOG_BODIES", "redact")
+LOG_BODY_MAX_CHARS = int(os.getenv("LOG_BODY_MAX_CHARS", "80"))
+
+# Attributes every LogRecord has; anything else was passed via extra= and goes into the JSON
+RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+# Message/response text for logging, redacted or truncated according to LOG_BODIES.
+# Evaluated only if the record is actually formatted.
+class Body:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __str__(self):
+        text = self.text or ""
+        if LOG_BODIES == "full":
+            return text
+        if LOG_BODIES == "truncate":
+            return text if len(text) <= LOG_BODY_MAX_CHARS else text[:LOG_BODY_MAX_CHARS] + "…"
+        return f"<{len(text)} chars>"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+# Console handler that writes a whole batch of records before a single flush
+class BatchStreamHandler(logging.StreamHandler):
+    def emit_batch(self, records):
+        self.acquire()
+        try:
+            lines = []
+            for record in records:
+                try:
+                    lines.append(self.format(record) + self.terminator)
+                except Exception:
+                    self.handleError(record)
+            self.stream.write("".join(lines))
+            self.flush()
+        finally:
+            self.release()
+
+
+# Rotating file handler that writes a whole batch of records before a single flush
+class BatchRotatingFileHandler(RotatingFileHandler):
+    def emit_batch(self, records):
+        self.acquire()
+        try:
+            for record in records:
+                try:
+                    if self.shouldRollover(record):
+                        self.doRollover()
+                    if self.stream is None:
+                        self.stream = self._open()
+                    self.stream.write(self.format(record) + self.terminator)
+                except Exception:
+                    self.handleError(record)
+            if self.stream is not None:
+                self.stream.flush()
+        finally:
+            self.release()
+
+
+# Never blocks the caller: when the queue is full the record is dropped and counted
+class DroppingQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message now (args may be mutated later) but leave JSON rendering to the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# Background writer thread: drains the queue in batches of up to batch_size,
+# or whatever arrived within flush_interval, and hands each batch to the handlers.
+class BatchQueueListener:
+    _sentinel = None
+
+    def __init__(self, log_queue, handlers, batch_size=256, flush_interval=0.5):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self.queue.put(self._sentinel)
+            self._thread.join()
+            self._thread = None
+        for handler in self.handlers:
+            handler.close()
+
+    def _run(self):
+        while True:
+            batch = []
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is self._sentinel:
+                    stopping = True
+                    break
+                batch.append(record)
+            if batch:
+                self._dispatch(batch)
+            if stopping:
+                return
+
+    def _dispatch(self, batch):
+        for handler in self.handlers:
+            records = [record for record in batch if record.levelno >= handler.level]
+            if not records:
+                continue
+            if hasattr(handler, "emit_batch"):
+                handler.emit_batch(records)
+            else:
+                for record in records:
+                    handler.handle(record)
+
+
+_listener = None
+_queue_handler = None
+
+
+# Route all logging through a bounded queue to a background writer with JSON lines in
+# <LOG_DIR>/<filename> (size-rotated) and plain text on the console. Safe to call repeatedly.
+def setup_logging(filename="app.log"):
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _queue_handler
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = BatchRotatingFileHandler(
+        os.path.join(LOG_DIR, filename), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = BatchStreamHandler()
+    console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = BatchQueueListener(log_queue, [file_handler, console_handler], LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _queue_handler
+
+
+# Flush everything still queued and stop the writer thread
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,11 +1,14 @@
 from fastapi import FastAPI, Request, Depends, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import Response
 import os
-from chatbot import handle_chat
+from chatbot import handle_chat, stream_chat, llm_router, context_cache, response_cache, chat_writer, cpu_executor
+from write_buffer import merge_pending
+from render_cache import HistoryRenderCache, render_history
+from admission import ChatAdmission, Rejected
 from dotenv import load_dotenv
 from authlib.integrations.starlette_client import OAuth
 # from authlib.integrations.starlette_client import StarletteRemoteApp
@@ -13,12 +16,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 from models import User, Chat
-from database import get_async_session
+from database import get_async_session, get_read_session, AsyncSessionLocal, dispose_engines, engine
+from compact_chats import compact_periodically
+from sanitizer import StreamSanitizer
+from log_config import setup_logging, shutdown_logging, Body, LOG_DIR
+from history import fetch_history_page, fetch_history_version, history_version_bump, chat_to_dict, DEFAULT_PAGE_SIZE
+from metrics import metrics, timed, MetricsMiddleware
 import logging
+import asyncio
 import secrets
-import bleach
+import json
 from datetime import datetime
-import mysql.connector
 from passlib.context import CryptContext
 
 load_dotenv()
@@ -27,19 +35,27 @@ app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# Configure logging
-log_dir = "D:\Programming Codes\python test codes\MYPROJECTS\chatbot\Fastapi_med_bot\logs"
-os.makedirs(log_dir, exist_ok=True)
-log_file = os.path.join(log_dir, "app.log")
-handler = logging.FileHandler(log_file, mode='a', encoding='utf-8')
-handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+# Configure logging (JSON lines in logs/app.log, queued and written by a background thread)
+log_handler = setup_logging()
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-logger.addHandler(handler)
-logger.addHandler(logging.StreamHandler())
-logger.info("Server startup - Attempting to log to %s", log_file)
-with open(log_file, 'a') as f:
-    f.write("Test write to confirm file access\n")
+logger.info("Server startup - logging to %s", os.path.join(LOG_DIR, "app.log"))
+
+# Request/stage latency metrics, served at /metrics
+app.add_middleware(MetricsMiddleware)
+metrics.add_gauge_source("context_cache", context_cache.stats)
+metrics.add_gauge_source("response_cache", response_cache.stats)
+metrics.add_gauge_source("log", lambda: {"dropped_records": log_handler.dropped})
+
+# Rendered chat history per user, invalidated on new messages and /clear_chat
+render_cache = HistoryRenderCache.from_env()
+metrics.add_gauge_source("render_cache", render_cache.stats)
+
+# Per-user coalescing and concurrency limit, global load shedding for chat requests
+admission = ChatAdmission.from_env(llm_slots=llm_router.max_concurrency)
+metrics.add_gauge_source("admission", admission.stats)
+metrics.add_gauge_source("llm", llm_router.stats)
+metrics.add_gauge_source("write_buffer", chat_writer.stats)
+metrics.add_gauge_source("cpu_executor", cpu_executor.stats)
 
 # Add session middleware
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SESSION_SECRET"))
@@ -47,129 +63,301 @@ app.add_middleware(SessionMiddleware, secret_key=os.getenv("SESSION_SECRET"))
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# MySQL connection
-db = mysql.connector.connect(
-    host="localhost",
-    user=os.getenv("MYSQL_USER", "your_username"),
-    password=os.getenv("MYSQL_PASSWORD", "your_password"),
-    database=os.getenv("MYSQL_DATABASE", "your_database")
-)
+# Optional in-process archival of soft-deleted chats every COMPACTION_INTERVAL seconds (see compact_chats.py)
+COMPACTION_INTERVAL = float(os.getenv("COMPACTION_INTERVAL", "0"))
+compaction_task = None
 
+@app.on_event("startup")
+async def on_startup():
+    global compaction_task
+    await cpu_executor.start()
+    if COMPACTION_INTERVAL > 0:
+        compaction_task = asyncio.create_task(compact_periodically(engine, COMPACTION_INTERVAL, on_history_changed=history_changed))
+        logger.info("Chat compaction scheduled every %gs", COMPACTION_INTERVAL)
+
+# Close the pooled LLM HTTP clients, CPU workers and database pools, and report cache usage
+@app.on_event("shutdown")
+async def on_shutdown():
+    if compaction_task is not None:
+        compaction_task.cancel()
+    await chat_writer.close()
+    await llm_router.aclose()
+    cpu_executor.shutdown()
+    await dispose_engines()
+    logger.info("Context cache stats: %s", context_cache.stats())
+    logger.info("Response cache stats: %s", response_cache.stats())
+    logger.info("Render cache stats: %s", render_cache.stats())
+    shutdown_logging()
 
 # Dependency to get current user from session
 async def get_current_user(request: Request):
     user = request.session.get("user")
     return user if user else {"username": "Guest", "id": 0}
 
+# Current history version of a user, read from the primary (the read session may be a replica)
+async def primary_history_version(user_id: int):
+    async with AsyncSessionLocal() as session:
+        return await fetch_history_version(session, user_id)
+
+# Visible history of a user prepared for the templates, from the render cache or the database.
+# The cached entry is checked against the primary, since other workers may have changed the history.
+async def get_rendered_history(db: AsyncSession, user_id: int):
+    version = await primary_history_version(user_id) if render_cache.verify else None
+    rendered = render_cache.get(user_id, version)
+    if rendered is None:
+        render_cache.begin_load(user_id)
+        # Read before the rows, from the same (possibly replica) session: a lagging replica
+        # returns an older version, so the rows it served are reloaded on the next lookup
+        loaded_version = await fetch_history_version(db, user_id) if render_cache.verify else None
+        result = await db.execute(
+            select(Chat).where(Chat.user_id == user_id, Chat.is_deleted == False).order_by(Chat.timestamp)
+        )
+        stored = result.scalars().all()
+        chats = merge_pending(stored, chat_writer.pending_for(user_id))
+        with timed("render_history"):
+            rendered = render_history(chats)
+        render_cache.fill(user_id, rendered, loaded_version)
+    return rendered
+
+# A new turn or a clear changes everything derived from the user's history
+def history_changed(user_id: int, message: str = None, response: str = None, version: int = None):
+    if message is None:
+        context_cache.invalidate(user_id)
+    else:
+        context_cache.append(user_id, message, response, version)
+    render_cache.invalidate(user_id)
+
 @app.get("/", response_class=HTMLResponse)
-async def read_root(request: Request, db: AsyncSession = Depends(get_async_session), user: dict = Depends(get_current_user)):
+async def read_root(request: Request, db: AsyncSession = Depends(get_read_session), user: dict = Depends(get_current_user)):
     try:
         current_user = user
-        result = await db.execute(
-            select(Chat).where(Chat.user_id == current_user["id"], Chat.is_deleted == False).order_by(Chat.timestamp)
-        )
-        chats = result.scalars().all()
-        chat_history = []
-        for chat in chats:
-            chat_history.append({
-                "user": True,
-                "text": chat.message,
-                "timestamp": chat.timestamp
-            })
-            chat_history.append({
-                "user": False,
-                "text": bleach.clean(chat.response, tags=['p', 'ul', 'li', 'h3', 'strong'], attributes={}),
-                "timestamp": chat.timestamp
-            })
+        chat_history = (await get_rendered_history(db, current_user["id"])).chat_history
         dark_mode = request.session.get("dark_mode", False)
-        logger.info(f"Root accessed by user: {current_user['username']}, History: {len(chat_history)} messages")
+        logger.info("Root accessed by user: %s, History: %d messages", current_user["username"], len(chat_history))
         return templates.TemplateResponse(
             "index.html",
             {"request": request, "user": current_user, "chat_history": chat_history, "dark_mode": dark_mode}
         )
     except Exception as e:
-        logger.error(f"Error in root: {str(e)}")
+        logger.error("Error in root: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.post("/chat")
-async def chat(request: Request, message: str = Form(...), db: AsyncSession = Depends(get_async_session), user: dict = Depends(get_current_user)):
+def rejected_response(e: Rejected):
+    return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+# Persist a turn: commit it now, or hand it to the write-behind buffer (WRITE_BEHIND=1).
+# Returns the user's history version right after the insert, or None while buffered.
+async def save_chat(db: AsyncSession, chat: Chat):
+    if chat_writer.enabled:
+        await chat_writer.add(chat)
+        return None
+    db.add(chat)
+    await db.execute(history_version_bump([chat.user_id]))
+    version = await fetch_history_version(db, chat.user_id)
+    await db.commit()
+    return version
+
+# Run the chatbot for one message and persist the turn; returns the stored Chat row
+async def process_chat_message(current_user: dict, message: str, db: AsyncSession):
     try:
         user_message = message.strip()
         if not user_message:
             raise HTTPException(status_code=400, detail="Empty message")
-        current_user = user
         bot_response = await handle_chat(current_user["id"], user_message, db)
         if not bot_response:
             bot_response = "Sorry, I couldn't process your request."
-        bot_response = bleach.clean(bot_response, tags=['p', 'ul', 'li', 'h3', 'strong'], attributes={})
+        with timed("sanitize_store"):
+            bot_response = await cpu_executor.sanitize(bot_response)
         chat = Chat(user_id=current_user["id"], message=user_message, response=bot_response, timestamp=datetime.now())
-        db.add(chat)
         try:
-            await db.commit()
+            with timed("commit"):
+                version = await save_chat(db, chat)
         except IntegrityError as ie:
-            logger.error(f"Integrity error in chat: {str(ie)}")
+            logger.error("Integrity error in chat: %s", ie)
             await db.rollback()
             raise HTTPException(status_code=400, detail="Invalid user ID, please log in or register.")
-        logger.info(f"Chat processed: User: {user_message}, Bot: {bot_response}")
+        history_changed(current_user["id"], user_message, bot_response, version)
+        logger.info("Chat processed: user_id=%s, User: %s, Bot: %s", current_user["id"], Body(user_message), Body(bot_response))
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"Error in /chat: {str(e)}")
+        logger.error("Error in /chat: %s", e)
         await db.rollback()
         bot_response = "Sorry, an error occurred. Please try again."
-        bot_response = bleach.clean(bot_response, tags=['p', 'ul', 'li', 'h3', 'strong'], attributes={})
         chat = Chat(user_id=current_user["id"], message=user_message, response=bot_response, timestamp=datetime.now())
         try:
-            db.add(chat)
-            await db.commit()
+            version = await save_chat(db, chat)
         except IntegrityError:
             await db.rollback()
             raise HTTPException(status_code=500, detail="Failed to log error message.")
+        history_changed(current_user["id"], user_message, bot_response, version)
+    return chat
+
+@app.post("/chat")
+async def chat(request: Request, message: str = Form(...), db: AsyncSession = Depends(get_async_session), user: dict = Depends(get_current_user)):
+    try:
+        await admission.submit(user["id"], message.strip(), lambda: process_chat_message(user, message, db))
+    except Rejected as e:
+        raise rejected_response(e)
     return RedirectResponse(url="/", status_code=303)
 
+# JSON variant of /chat: returns only the new exchange instead of redirecting to the full history
+@app.post("/api/chat")
+async def api_chat(request: Request, message: str = Form(...), db: AsyncSession = Depends(get_async_session), user: dict = Depends(get_current_user)):
+    try:
+        chat = await admission.submit(user["id"], message.strip(), lambda: process_chat_message(user, message, db))
+    except Rejected as e:
+        raise rejected_response(e)
+    return chat_to_dict(chat)
+
+# Keyset-paginated history, newest page first; pass next_cursor back to load older turns
+@app.get("/api/history")
+async def api_history(request: Request, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE, db: AsyncSession = Depends(get_read_session), user: dict = Depends(get_current_user)):
+    try:
+        chats, next_cursor = await fetch_history_page(db, user["id"], cursor=cursor, limit=limit)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    if not cursor:
+        # Newest page: include the user's turns still waiting in the write-behind buffer
+        chats = merge_pending(chats, chat_writer.pending_for(user["id"]))
+    return {"items": [chat_to_dict(chat) for chat in chats], "next_cursor": next_cursor}
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+# Forward sanitized model deltas as server-sent events, then persist the finished Chat row.
+# The stored row is handed to identical submissions that were coalesced onto this one.
+async def stream_chat_events(user_id, user_message, ticket):
+    sanitizer = StreamSanitizer()
+    parts = []
+    stored = None
+    try:
+        # The request-scoped session is closed before a streaming body runs, so use our own
+        async with AsyncSessionLocal() as db:
+            try:
+                async for delta in stream_chat(user_id, user_message, db):
+                    parts.append(delta)
+                    safe = sanitizer.feed(delta)
+                    if safe:
+                        yield sse_event({"delta": safe})
+                tail = sanitizer.flush()
+                if tail:
+                    yield sse_event({"delta": tail})
+            except Exception as e:
+                logger.error("Error in /chat/stream: %s", e)
+            raw_response = ''.join(parts).strip()
+            if raw_response:
+                bot_response = await cpu_executor.sanitize(raw_response)
+            else:
+                bot_response = "Sorry, I couldn't process your request."
+                yield sse_event({"delta": bot_response})
+            chat = Chat(user_id=user_id, message=user_message, response=bot_response, timestamp=datetime.now())
+            try:
+                version = await save_chat(db, chat)
+            except Exception as e:
+                logger.error("Error saving streamed chat: %s", e)
+                await db.rollback()
+                yield sse_event({"detail": "Failed to save chat message."}, event="error")
+                return
+            stored = chat
+            history_changed(user_id, user_message, bot_response, version)
+            logger.info("Streamed chat processed: user_id=%s, User: %s, Bot: %s", user_id, Body(user_message), Body(bot_response))
+            yield sse_event({"id": chat.id, "response": bot_response, "timestamp": chat.timestamp.isoformat()}, event="done")
+    finally:
+        admission.finish(ticket, stored)
+
+# A duplicate submission: wait for the leader's stored row and replay it as a single delta
+async def coalesced_chat_events(ticket):
+    try:
+        chat = await admission.wait(ticket)
+    except Exception as e:
+        logger.error("Coalesced /chat/stream request failed: %s", e)
+        chat = None
+    if chat is None:
+        yield sse_event({"detail": "Failed to save chat message."}, event="error")
+        return
+    yield sse_event({"delta": chat.response})
+    yield sse_event({"id": chat.id, "response": chat.response, "timestamp": chat.timestamp.isoformat()}, event="done")
+
+# Streams a leader's events and releases its admission ticket however the response ends.
+# A client that disconnects before the body is first iterated never runs the generator's
+# finally, so the ticket is released here as well (finish() ignores the second call).
+class AdmittedStreamingResponse(StreamingResponse):
+    def __init__(self, content, ticket, **kwargs):
+        super().__init__(content, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            admission.finish(self.ticket)
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request, message: str = Form(...), user: dict = Depends(get_current_user)):
+    user_message = message.strip()
+    if not user_message:
+        raise HTTPException(status_code=400, detail="Empty message")
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    ticket = admission.inflight(user["id"], user_message)
+    if ticket is not None:
+        return StreamingResponse(coalesced_chat_events(ticket), media_type="text/event-stream", headers=headers)
+    try:
+        ticket = admission.admit(user["id"], user_message)
+    except Rejected as e:
+        raise rejected_response(e)
+    return AdmittedStreamingResponse(
+        stream_chat_events(user["id"], user_message, ticket), ticket,
+        media_type="text/event-stream", headers=headers
+    )
+
 @app.post("/clear_chat")
 async def clear_chat(request: Request, db: AsyncSession = Depends(get_async_session), user: dict = Depends(get_current_user)):
     try:
         current_user = user
+        # Buffered turns must be in the table before they can be marked deleted
+        await chat_writer.flush()
         await db.execute(
             Chat.__table__.update()
             .where(Chat.user_id == current_user["id"], Chat.is_deleted == False)
             .values(is_deleted=True)
         )
+        await db.execute(history_version_bump([current_user["id"]]))
         await db.commit()
+        history_changed(current_user["id"])
         logger.info("Chat history marked as cleared")
         return RedirectResponse(url="/", status_code=303)
     except Exception as e:
-        logger.error(f"Error in clear_chat: {str(e)}")
+        logger.error("Error in clear_chat: %s", e)
         await db.rollback()
         raise HTTPException(status_code=500, detail="Failed to clear chat history")
 
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(request: Request, db: AsyncSession = Depends(get_async_session), user: dict = Depends(get_current_user)):
+async def dashboard(request: Request, db: AsyncSession = Depends(get_read_session), user: dict = Depends(get_current_user)):
     try:
         current_user = user
-        result = await db.execute(
-            select(Chat).where(Chat.user_id == current_user["id"], Chat.is_deleted == False).order_by(Chat.timestamp)
-        )
-        chats = result.scalars().all()
-        for chat in chats:
-            chat.response = bleach.clean(chat.response, tags=['p', 'ul', 'li', 'h3', 'strong'], attributes={})
+        chats = (await get_rendered_history(db, current_user["id"])).rows
         dark_mode = request.session.get("dark_mode", False)
-        logger.info(f"Dashboard accessed by user: {current_user['username']}")
+        logger.info("Dashboard accessed by user: %s", current_user["username"])
         return templates.TemplateResponse(
             "dashboard.html",
             {"request": request, "user": current_user, "chat_history": chats, "dark_mode": dark_mode}
         )
     except Exception as e:
-        logger.error(f"Error in dashboard: {str(e)}")
+        logger.error("Error in dashboard: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/toggle_dark_mode")
 async def toggle_dark_mode(request: Request):
     try:
         request.session["dark_mode"] = not request.session.get("dark_mode", False)
-        logger.info(f"Dark mode toggled to: {request.session['dark_mode']}")
+        logger.info("Dark mode toggled to: %s", request.session["dark_mode"])
         return RedirectResponse(url="/", status_code=303)
     except Exception as e:
-        logger.error(f"Error in toggle_dark_mode: {str(e)}")
+        logger.error("Error in toggle_dark_mode: %s", e)
         raise HTTPException(status_code=500, detail="Failed to toggle dark mode")
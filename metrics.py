@@ -0,0 +1,164 @@
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Prometheus-style latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Stage timings of the current request, for the Server-Timing debug header
+request_timings = ContextVar("request_timings", default=None)
+
+
+# Bucketed histogram plus a sliding window of recent observations for p50/p95/p99
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=2048):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantile(self, q):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self, namespace="chatbot"):
+        self.namespace = namespace
+        self._histograms = {}
+        self._counters = {}
+        self._gauge_sources = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    # Expose the numeric fields of stats_fn() (e.g. a cache's stats()) as <namespace>_<prefix>_<field> gauges
+    def add_gauge_source(self, prefix, stats_fn):
+        self._gauge_sources[prefix] = stats_fn
+
+    def quantile(self, name, q, **labels):
+        histogram = self._histograms.get((name, tuple(sorted(labels.items()))))
+        return histogram.quantile(q) if histogram else 0.0
+
+    # Prometheus text exposition format (version 0.0.4); samples are grouped per metric family
+    def render(self):
+        with self._lock:
+            histograms = sorted(self._histograms.items(), key=lambda item: (item[0][0], str(item[0][1])))
+            counters = sorted(self._counters.items(), key=lambda item: (item[0][0], str(item[0][1])))
+        families = {}
+        for (name, labels), histogram in histograms:
+            metric = f"{self.namespace}_{name}"
+            bucket_lines = families.setdefault((metric, "histogram"), [])
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                cumulative += count
+                bucket_lines.append(f"{metric}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+            bucket_lines.append(f"{metric}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            bucket_lines.append(f"{metric}_sum{format_labels(labels)} {histogram.sum:.6f}")
+            bucket_lines.append(f"{metric}_count{format_labels(labels)} {histogram.count}")
+            # p50/p95/p99 over the most recent observations
+            quantile_lines = families.setdefault((f"{metric}_recent", "summary"), [])
+            for q in QUANTILES:
+                quantile_lines.append(f"{metric}_recent{format_labels(labels + (('quantile', q),))} {histogram.quantile(q):.6f}")
+        for (name, labels), value in counters:
+            metric = f"{self.namespace}_{name}"
+            families.setdefault((metric, "counter"), []).append(f"{metric}{format_labels(labels)} {value}")
+        for prefix, stats_fn in sorted(self._gauge_sources.items()):
+            for field, value in stats_fn().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric = f"{self.namespace}_{prefix}_{field}"
+                    families.setdefault((metric, "gauge"), []).append(f"{metric} {value}")
+        lines = []
+        for (metric, kind), samples in families.items():
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+# Time a /chat stage: recorded in the stage histogram and in the current request's timings
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("stage_duration_seconds", elapsed, stage=stage)
+        timings = request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def server_timing_header(timings):
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings)
+
+
+# ASGI middleware: per-route request latency, and a Server-Timing header with the stage
+# timings when METRICS_TIMING_HEADER=1 or the client sends "X-Debug-Timing: 1".
+class MetricsMiddleware:
+    def __init__(self, app, always_time=None):
+        self.app = app
+        self.always_time = os.getenv("METRICS_TIMING_HEADER", "0") == "1" if always_time is None else always_time
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings = []
+        token = request_timings.set(timings)
+        want_header = self.always_time or (b"x-debug-timing", b"1") in scope.get("headers", [])
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if want_header:
+                    total = time.perf_counter() - start
+                    header = server_timing_header(timings + [("total", total)])
+                    message = {**message, "headers": list(message.get("headers", [])) + [(b"server-timing", header.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_timings.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            metrics.observe("request_duration_seconds", time.perf_counter() - start, path=path, method=scope["method"])
+            metrics.inc("requests_total", path=path, method=scope["method"], status=status["code"])
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from base import Base
 from datetime import datetime
@@ -10,6 +10,8 @@ class User(Base):
     username = Column(String(50), unique=True, index=True, nullable=False)
     hashed_password = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True)
+    # Bumped with every stored, cleared or archived visible chat (see history.py)
+    history_version = Column(Integer, nullable=False, default=0, server_default="0")
     chats = relationship("Chat", back_populates="user")
 
 class Chat(Base):
@@ -20,4 +22,21 @@ class Chat(Base):
     response = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
     user = relationship("User", back_populates="chats")
-    is_deleted = Column(Boolean, default=False)
\ No newline at end of file
+    is_deleted = Column(Boolean, default=False)
+    # Covers the history/context lookups: filter user_id + is_deleted, order by timestamp.
+    # ix_chats_deleted_id lets compact_chats.py find soft-deleted rows without scanning the table.
+    __table_args__ = (
+        Index("ix_chats_user_deleted_timestamp", "user_id", "is_deleted", "timestamp"),
+        Index("ix_chats_deleted_id", "is_deleted", "id"),
+    )
+
+# Chats moved out of the live table by compact_chats.py; message and response are
+# stored together as zlib-compressed JSON in payload
+class ChatArchive(Base):
+    __tablename__ = "chats_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, index=True)
+    timestamp = Column(DateTime)
+    is_deleted = Column(Boolean, default=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    payload = Column(LargeBinary)
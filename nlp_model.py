@@ -0,0 +1,70 @@
+import hashlib
+import logging
+import os
+from functools import lru_cache
+from importlib import metadata
+
+import spacy
+from dotenv import load_dotenv
+
+from term_index import TermIndex
+
+load_dotenv()
+
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_md")
+MEDICAL_TERMS_PATH = os.getenv("MEDICAL_TERMS_PATH", "medical_term.txt")
+NLP_CACHE_DIR = os.getenv("NLP_CACHE_DIR", ".cache")
+
+# We only use static document vectors, which come from the vocab and the tokenizer;
+# none of the trained pipeline components are needed.
+UNUSED_PIPES = ["tok2vec", "tagger", "parser", "senter", "attribute_ruler", "lemmatizer", "ner"]
+
+
+# Vectors-only spaCy pipeline, loaded on first use
+@lru_cache(maxsize=None)
+def get_nlp():
+    nlp = spacy.load(SPACY_MODEL, exclude=UNUSED_PIPES)
+    logging.info(f"Loaded spaCy model {SPACY_MODEL} with pipes: {nlp.pipe_names or 'none (vectors only)'}")
+    return nlp
+
+
+# Cache files are keyed by the terms file contents and the model name/version
+def term_cache_prefix(terms_bytes):
+    try:
+        model_version = metadata.version(SPACY_MODEL)
+    except metadata.PackageNotFoundError:
+        model_version = "local"
+    digest = hashlib.sha256(terms_bytes)
+    digest.update(f"{SPACY_MODEL}=={model_version}".encode())
+    return os.path.join(NLP_CACHE_DIR, f"term_vectors-{digest.hexdigest()[:16]}")
+
+
+# Medical term index: memory-mapped from the on-disk cache, built (and cached) on a miss
+@lru_cache(maxsize=None)
+def get_term_index():
+    try:
+        with open(MEDICAL_TERMS_PATH, "rb") as file:
+            terms_bytes = file.read()
+    except Exception as e:
+        logging.error(f"Error loading medical terms: {e}")
+        return TermIndex.from_nlp(get_nlp(), [])
+    prefix = term_cache_prefix(terms_bytes)
+    try:
+        return TermIndex.load(prefix)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable term vector cache {prefix}: {e}")
+    index = TermIndex.from_nlp(get_nlp(), terms_bytes.decode().splitlines())
+    try:
+        index.save(prefix)
+        logging.info(f"Cached {len(index)} medical term vectors to {prefix}.npy")
+    except OSError as e:
+        logging.warning(f"Could not write term vector cache {prefix}: {e}")
+    return index
+
+
+def warm():
+    get_nlp()
+    if not len(get_term_index()):
+        logging.warning("Medical terms list is empty.")
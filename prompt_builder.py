@@ -0,0 +1,97 @@
+import math
+import os
+import re
+from dataclasses import dataclass
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+TAG_RE = re.compile(r"<[^>]+>")
+SPACE_RE = re.compile(r"\s+")
+
+
+# Local approximation of a BPE tokenizer: one token per punctuation mark,
+# roughly one per four characters of each word.
+def count_tokens(text):
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in TOKEN_RE.findall(text))
+
+
+# Keep roughly the first max_tokens tokens of text, marking the cut with an ellipsis (one token)
+def truncate_tokens(text, max_tokens):
+    if count_tokens(text) <= max_tokens:
+        return text
+    used = 0
+    for match in TOKEN_RE.finditer(text):
+        used += max(1, math.ceil(len(match.group()) / 4))
+        if used > max_tokens - 1:
+            return text[:match.start()].rstrip() + " …"
+    return text
+
+
+# Previous AI answers are HTML; the model only needs their text
+def strip_html(text):
+    return SPACE_RE.sub(" ", TAG_RE.sub(" ", text)).strip()
+
+
+@dataclass
+class BuiltPrompt:
+    text: str
+    tokens: int
+    context_tokens: int
+    question_tokens: int
+    turns_included: int
+    turns_truncated: int
+    turns_dropped: int
+
+
+# Packs the most recent turns into a token budget for the user prompt.
+# Whole turns are added newest first; the first turn that does not fit is truncated
+# if enough budget is left, and anything older is dropped.
+class PromptBuilder:
+    def __init__(self, template, token_budget=3000, min_truncated_tokens=48):
+        self.template = template
+        self.token_budget = token_budget
+        self.min_truncated_tokens = min_truncated_tokens
+        self.template_tokens = count_tokens(template.format(context="", question=""))
+
+    @classmethod
+    def from_env(cls, template):
+        return cls(
+            template,
+            token_budget=int(os.getenv("PROMPT_TOKEN_BUDGET", "3000")),
+            min_truncated_tokens=int(os.getenv("PROMPT_MIN_TRUNCATED_TOKENS", "48")),
+        )
+
+    def build(self, turns, question):
+        question_budget = max(self.min_truncated_tokens, self.token_budget - self.template_tokens)
+        question = truncate_tokens(question, question_budget)
+        question_tokens = count_tokens(question)
+        remaining = self.token_budget - self.template_tokens - question_tokens
+
+        lines = []
+        included = truncated = 0
+        for message, response in reversed(turns):
+            user_line = f"User: {message}"
+            ai_line = f"AI: {strip_html(response)}"
+            cost = count_tokens(user_line) + count_tokens(ai_line)
+            if cost <= remaining:
+                lines[:0] = [user_line, ai_line]
+                remaining -= cost
+                included += 1
+                continue
+            if remaining >= self.min_truncated_tokens:
+                user_line = truncate_tokens(user_line, remaining // 2)
+                ai_line = truncate_tokens(ai_line, remaining - count_tokens(user_line))
+                lines[:0] = [user_line, ai_line]
+                truncated += 1
+            break
+
+        context = "\n".join(lines)
+        context_tokens = count_tokens(context)
+        return BuiltPrompt(
+            text=self.template.format(context=context, question=question),
+            tokens=self.template_tokens + context_tokens + question_tokens,
+            context_tokens=context_tokens,
+            question_tokens=question_tokens,
+            turns_included=included,
+            turns_truncated=truncated,
+            turns_dropped=len(turns) - included - truncated,
+        )
@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from markupsafe import Markup
+
+
+@dataclass(frozen=True)
+class HistoryRow:
+    message: str
+    response: Markup
+    timestamp: datetime
+
+
+# A user's visible history prepared for the templates: rows for the dashboard and the
+# alternating user/bot entries of the chat page. Responses are Markup (sanitized at write time).
+@dataclass(frozen=True)
+class RenderedHistory:
+    rows: tuple
+    chat_history: tuple
+
+
+def render_history(chats):
+    rows = tuple(HistoryRow(chat.message, Markup(chat.response), chat.timestamp) for chat in chats)
+    chat_history = []
+    for row in rows:
+        chat_history.append({"user": True, "text": row.message, "timestamp": row.timestamp})
+        chat_history.append({"user": False, "text": row.response, "timestamp": row.timestamp})
+    return RenderedHistory(rows, tuple(chat_history))
+
+
+# Per-user cache of rendered history, LRU-evicted by user count.
+# Invalidated whenever the user's history changes in this process (new message or /clear_chat).
+# Entries carry the history version (users.history_version, see history.fetch_history_version)
+# they were rendered from; get() with the current version drops entries changed by other workers.
+class HistoryRenderCache:
+    def __init__(self, max_users=1000, verify=True):
+        self.max_users = max_users
+        self.verify = verify
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_users=int(os.getenv("RENDER_CACHE_MAX_USERS", "1000")),
+            verify=os.getenv("RENDER_CACHE_VERIFY", "1") == "1",
+        )
+
+    # Cached history, or None on a miss or when version (if given) differs from the cached one
+    def get(self, user_id, version=None):
+        with self._lock:
+            rendered = self._entries.get(user_id)
+            if rendered is not None and version is not None and self._versions.get(user_id) != version:
+                self._remove(user_id)
+                self.stale += 1
+                rendered = None
+            if rendered is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return rendered
+
+    # Call before reading from the DB so a write racing with the load can discard the stale fill
+    def begin_load(self, user_id):
+        with self._lock:
+            self._loading[user_id] = False
+
+    def fill(self, user_id, rendered, version=None):
+        with self._lock:
+            if self._loading.pop(user_id, True) or self.max_users <= 0:
+                return
+            self._entries[user_id] = rendered
+            self._versions[user_id] = version
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = True
+            self._remove(user_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "stale": self.stale,
+            }
+
+    def _remove(self, user_id):
+        self._entries.pop(user_id, None)
+        self._versions.pop(user_id, None)
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+NORMALIZE_RE = re.compile(r"[^\w\s]")
+SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    return SPACE_RE.sub(" ", NORMALIZE_RE.sub(" ", text.lower())).strip()
+
+
+def context_hash(turns):
+    digest = hashlib.sha1()
+    for message, response in turns:
+        digest.update(message.encode())
+        digest.update(b"\x00")
+        digest.update(response.encode())
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    response: str
+    expires_at: float
+    latency: float
+    size: int
+    slot: Optional[int] = None
+
+
+# Cache of LLM responses for repeated questions, keyed on the normalized question and a
+# hash of the conversation context. In semantic mode a miss falls back to the closest cached
+# question (cosine over the spaCy vectors from is_medical_question) above a threshold.
+# Requests with conversation context bypass the cache unless allow_context is set.
+# Normalized question vectors live in a preallocated matrix, one row (slot) per entry;
+# freed slots are zeroed and reused, so puts and evictions never rebuild it.
+class ResponseCache:
+    def __init__(self, enabled=True, ttl=3600, max_entries=5000, max_bytes=16 * 1024 * 1024,
+                 semantic=False, semantic_threshold=0.95, allow_context=False):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.semantic = semantic
+        self.semantic_threshold = semantic_threshold
+        self.allow_context = allow_context
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._slot_keys = []
+        self._free_slots = []
+        self.total_bytes = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.latency_saved = 0.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1",
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000")),
+            max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+            semantic=os.getenv("RESPONSE_CACHE_SEMANTIC", "0") == "1",
+            semantic_threshold=float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0.95")),
+            allow_context=os.getenv("RESPONSE_CACHE_ALLOW_CONTEXT", "0") == "1",
+        )
+
+    def bypass(self, turns):
+        return not self.enabled or (bool(turns) and not self.allow_context)
+
+    def get(self, question, turns, vector=None):
+        if self.bypass(turns):
+            with self._lock:
+                self.bypasses += 1
+            return None
+        key = (normalize_question(question), context_hash(turns))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(key, now)
+            if entry is None and self.semantic and vector is not None:
+                key = self._nearest(key[1], vector, now)
+                entry = self._lookup(key, now) if key else None
+                if entry is not None:
+                    self.semantic_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.latency_saved += entry.latency
+            return entry.response
+
+    # latency: seconds the LLM call took, credited as saved on every later hit
+    def put(self, question, turns, response, vector=None, latency=0.0):
+        if not response or self.bypass(turns):
+            return
+        key = (normalize_question(question), context_hash(turns))
+        size = len(key[0]) + len(response.encode())
+        if size > self.max_bytes:
+            return
+        if vector is not None:
+            norm = float(np.linalg.norm(vector))
+            vector = np.asarray(vector, dtype=np.float32) / norm if norm else None
+        with self._lock:
+            self._remove(key)
+            slot = self._add_vector(key, vector) if self.semantic and vector is not None else None
+            self._entries[key] = CacheEntry(response, time.monotonic() + self.ttl, latency, size, slot)
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors = None
+            self._slot_keys = []
+            self._free_slots = []
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "latency_saved_seconds": round(self.latency_saved, 3),
+            }
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            self._remove(key)
+            return None
+        return entry
+
+    def _add_vector(self, key, vector):
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = len(self._slot_keys)
+            self._slot_keys.append(None)
+            if self._vectors is None or slot >= len(self._vectors):
+                # Grow by doubling, so the copy is amortized over many puts
+                capacity = max(64, 2 * slot)
+                grown = np.zeros((capacity, len(vector)), dtype=np.float32)
+                if self._vectors is not None:
+                    grown[:slot] = self._vectors[:slot]
+                self._vectors = grown
+        self._vectors[slot] = vector
+        self._slot_keys[slot] = key
+        return slot
+
+    # Key of the most similar cached question with the same context hash, if above the threshold
+    def _nearest(self, ctx_hash, vector, now):
+        norm = float(np.linalg.norm(vector))
+        if not norm or not self._slot_keys:
+            return None
+        scores = self._vectors[:len(self._slot_keys)] @ (np.asarray(vector, dtype=np.float32) / norm)
+        candidates = np.flatnonzero(scores >= self.semantic_threshold)
+        for idx in candidates[np.argsort(scores[candidates])[::-1]]:
+            key = self._slot_keys[idx]
+            if key is not None and key[1] == ctx_hash and key in self._entries and self._entries[key].expires_at > now:
+                return key
+        return None
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+            if entry.slot is not None:
+                self._vectors[entry.slot] = 0.0
+                self._slot_keys[entry.slot] = None
+                self._free_slots.append(entry.slot)
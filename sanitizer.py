@@ -0,0 +1,85 @@
+import html
+import re
+import threading
+
+from bleach.sanitizer import Cleaner
+
+# Tags allowed in bot responses; all attributes are stripped
+ALLOWED_TAGS = ['p', 'ul', 'li', 'h3', 'strong']
+
+ALLOWED_TAG_RE = re.compile(r'^<\s*(/?)\s*(' + '|'.join(ALLOWED_TAGS) + r')\b[^>]*>$', re.IGNORECASE)
+BARE_AMPERSAND_RE = re.compile(r'&(?!#?\w+;)')
+
+# Longest '<...>' or '&...;' we hold back waiting for the closing character
+MAX_PENDING = 64
+
+
+# bleach.clean() constructs a new Cleaner (and html5lib parser) on every call, so one is
+# built per thread and reused. A Cleaner is not thread-safe (see cpu_executor.py thread mode).
+_local = threading.local()
+
+
+def get_cleaner():
+    cleaner = getattr(_local, "cleaner", None)
+    if cleaner is None:
+        cleaner = _local.cleaner = Cleaner(tags=ALLOWED_TAGS, attributes={})
+    return cleaner
+
+
+# Bot responses are sanitized once, right before they are stored; stored HTML is trusted afterwards
+def sanitize_html(text):
+    return get_cleaner().clean(text)
+
+
+def escape_text(text):
+    return BARE_AMPERSAND_RE.sub('&amp;', text).replace('<', '&lt;').replace('>', '&gt;')
+
+
+def sanitize_tag(tag):
+    match = ALLOWED_TAG_RE.match(tag)
+    if match:
+        return f"<{match.group(1)}{match.group(2).lower()}>"
+    return html.escape(tag, quote=False)
+
+
+# Incremental sanitizer for streamed model output.
+# Complete allowed tags pass through without attributes, everything else is escaped as text.
+# A trailing partial tag or entity is held back until the next chunk completes it.
+class StreamSanitizer:
+    def __init__(self):
+        self.pending = ''
+
+    def feed(self, chunk):
+        text = self.pending + chunk
+        out = []
+        pos = 0
+        while True:
+            start = text.find('<', pos)
+            if start == -1:
+                break
+            end = text.find('>', start)
+            if end == -1:
+                if len(text) - start > MAX_PENDING:
+                    # Not a tag after all: escape the '<' and keep scanning
+                    out.append(escape_text(text[pos:start + 1]))
+                    pos = start + 1
+                    continue
+                out.append(escape_text(text[pos:start]))
+                self.pending = text[start:]
+                return ''.join(out)
+            out.append(escape_text(text[pos:start]))
+            out.append(sanitize_tag(text[start:end + 1]))
+            pos = end + 1
+        tail = text[pos:]
+        amp = tail.rfind('&')
+        if amp != -1 and ';' not in tail[amp:] and len(tail) - amp <= MAX_PENDING:
+            out.append(escape_text(tail[:amp]))
+            self.pending = tail[amp:]
+        else:
+            out.append(escape_text(tail))
+            self.pending = ''
+        return ''.join(out)
+
+    def flush(self):
+        text, self.pending = self.pending, ''
+        return escape_text(text)
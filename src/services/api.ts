@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { ChatResponse } from '../types';
+import { ChatResponse, ChatTurn, HistoryPage } from '../types';
 
 const API_BASE_URL = 'http://localhost:8000';
 
@@ -12,14 +12,77 @@ const api = axios.create({
 });
 
 export const chatApi = {
-  sendMessage: async (message: string): Promise<string> => {
-    const formData = new FormData();
+  // Streams the bot reply from /chat/stream (server-sent events).
+  // onDelta receives sanitized HTML fragments as they arrive; the resolved
+  // value is the final sanitized response as persisted by the backend.
+  sendMessage: async (
+    message: string,
+    onDelta?: (fragment: string) => void,
+  ): Promise<ChatResponse> => {
+    const formData = new URLSearchParams();
     formData.append('message', message);
-    
-    const response = await api.post('/chat', formData);
-    
-    // Since your backend redirects to '/', we need to handle this differently
-    // We'll need to fetch the updated chat history or modify the backend to return JSON
+
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+      method: 'POST',
+      credentials: 'include',
+      headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+      body: formData,
+    });
+    if (!response.ok || !response.body) {
+      // 429 (another reply still pending) and 503 (server busy) carry Retry-After in seconds
+      const retryAfter = response.headers.get('Retry-After');
+      throw new Error(
+        retryAfter
+          ? `Chat request failed with status ${response.status}, retry in ${retryAfter}s`
+          : `Chat request failed with status ${response.status}`,
+      );
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let streamed = '';
+    let result: ChatResponse | null = null;
+
+    const handleEvent = (raw: string) => {
+      let event = 'message';
+      let data = '';
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (!data) return;
+      const payload = JSON.parse(data);
+      if (event === 'done') {
+        result = { response: payload.response, timestamp: payload.timestamp };
+      } else if (event === 'error') {
+        throw new Error(payload.detail);
+      } else if (payload.delta) {
+        streamed += payload.delta;
+        onDelta?.(payload.delta);
+      }
+    };
+
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        handleEvent(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+      }
+    }
+
+    return result ?? { response: streamed, timestamp: new Date().toISOString() };
+  },
+
+  // Non-streaming JSON variant: returns only the new exchange.
+  postMessage: async (message: string): Promise<ChatTurn> => {
+    const formData = new URLSearchParams();
+    formData.append('message', message);
+    const response = await api.post<ChatTurn>('/api/chat', formData);
     return response.data;
   },
 
@@ -31,9 +94,10 @@ export const chatApi = {
     await api.post('/toggle_dark_mode');
   },
 
-  getChatHistory: async (): Promise<any> => {
-    const response = await api.get('/');
-    return response.data;
+  // Pass the previous page's nextCursor to load older turns.
+  getChatHistory: async (cursor?: string, limit = 20): Promise<HistoryPage> => {
+    const response = await api.get('/api/history', { params: { cursor, limit } });
+    return { items: response.data.items, nextCursor: response.data.next_cursor };
   },
 
   getDashboard: async (): Promise<any> => {
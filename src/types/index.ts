@@ -30,4 +30,16 @@ export interface ApiResponse {
 export interface ChatResponse {
   response: string;
   timestamp: string;
-}
\ No newline at end of file
+}
+
+export interface ChatTurn {
+  id: number;
+  message: string;
+  response: string;
+  timestamp: string;
+}
+
+export interface HistoryPage {
+  items: ChatTurn[];
+  nextCursor: string | null;
+}
@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class TermMatch:
+    is_medical: bool
+    term: Optional[str]
+    score: float
+
+
+# Precomputed matrix of L2-normalized medical term vectors.
+# Classification is one matrix-vector product instead of a Doc.similarity call per term.
+class TermIndex:
+    def __init__(self, terms: List[str], vectors: np.ndarray):
+        self.terms = terms
+        self.matrix = vectors
+
+    def __len__(self):
+        return len(self.terms)
+
+    @classmethod
+    def from_nlp(cls, nlp, raw_terms: Iterable[str]):
+        terms = list(dict.fromkeys(t.strip() for t in raw_terms if t.strip()))
+        kept, rows = [], []
+        for term, doc in zip(terms, nlp.pipe(terms)):
+            # Terms without a vector can never pass the threshold (spaCy scores them 0.0)
+            if doc.vector_norm:
+                kept.append(term)
+                rows.append(doc.vector / doc.vector_norm)
+        if len(kept) < len(terms):
+            logging.warning(f"{len(terms) - len(kept)} medical terms have no vector and are ignored.")
+        if not rows:
+            return cls([], np.zeros((0, nlp.vocab.vectors_length), dtype=np.float32))
+        return cls(kept, np.vstack(rows).astype(np.float32))
+
+    # Persist as <prefix>.npy (vectors) + <prefix>.json (terms); written atomically so
+    # concurrently starting workers never see a partial file
+    def save(self, prefix):
+        os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+        for suffix, write in (
+            (".npy", lambda f: np.save(f, self.matrix)),
+            (".json", lambda f: f.write(json.dumps(self.terms).encode())),
+        ):
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(prefix) or ".", suffix=suffix)
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, prefix + suffix)
+
+    # Memory-map the vectors so every worker process shares the same page-cache pages
+    @classmethod
+    def load(cls, prefix):
+        with open(prefix + ".json", "r") as f:
+            terms = json.load(f)
+        matrix = np.load(prefix + ".npy", mmap_mode="r")
+        if len(terms) != matrix.shape[0]:
+            raise ValueError(f"Term vector cache {prefix} is inconsistent")
+        return cls(terms, matrix)
+
+    # Best matching term for an (unnormalized) query vector
+    def best_match(self, vector: np.ndarray, threshold: float = 0.5) -> TermMatch:
+        if not self.terms:
+            return TermMatch(False, None, 0.0)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return TermMatch(False, None, 0.0)
+        scores = self.matrix @ (np.asarray(vector, dtype=np.float32) / norm)
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        return TermMatch(score > threshold, self.terms[best], score)
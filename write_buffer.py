@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from history import history_version_bump
+from models import Chat
+
+
+def chat_row(chat):
+    return {
+        "user_id": chat.user_id,
+        "message": chat.message,
+        "response": chat.response,
+        "timestamp": chat.timestamp,
+        "is_deleted": False,
+    }
+
+
+# Identifies a buffered turn before and after its insert. Buffered timestamps are cut to whole
+# seconds (see ChatWriteBuffer.add), so a DATETIME column without fractional seconds, which
+# may round rather than truncate, stores the same value.
+def pending_key(chat):
+    return chat.timestamp.replace(microsecond=0), chat.message
+
+
+# Stored chats plus the user's still-buffered ones, oldest first. A buffered row that was
+# committed while the stored chats were being read is only kept once.
+def merge_pending(chats, pending):
+    if not pending:
+        return list(chats)
+    stored = {pending_key(chat) for chat in chats}
+    merged = list(chats) + [chat for chat in pending if pending_key(chat) not in stored]
+    return sorted(merged, key=lambda chat: chat.timestamp)
+
+
+# Opt-in write-behind persistence for Chat rows (WRITE_BEHIND=1).
+# Rows are buffered in memory and written with one multi-row INSERT per batch, when
+# batch_size rows are waiting or every flush_interval seconds. The buffer is bounded:
+# once max_pending rows are waiting, add() blocks until a flush makes room.
+# Buffered rows have no id until flushed; readers merge pending_for(user_id) into
+# their results so users see their own turns. The buffer belongs to one worker process,
+# so that only holds for requests served by the worker that buffered the turn.
+class ChatWriteBuffer:
+    def __init__(self, engine, enabled=False, batch_size=100, flush_interval=0.5, max_pending=5000):
+        self.engine = engine
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._flushing = []
+        self._lock = None
+        self._space = None
+        self._wake = None
+        self._task = None
+        self.flushed = 0
+        self.commits = 0
+        self.waits = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_env(cls, engine):
+        return cls(
+            engine,
+            enabled=os.getenv("WRITE_BEHIND", "0") == "1",
+            batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100")),
+            flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5")),
+            max_pending=int(os.getenv("WRITE_BEHIND_MAX_PENDING", "5000")),
+        )
+
+    @property
+    def buffered(self):
+        return len(self._pending) + len(self._flushing)
+
+    # Created lazily so they bind to the running event loop
+    def _start(self):
+        if self._task is None:
+            self._lock = asyncio.Lock()
+            self._space = asyncio.Condition()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, chat):
+        self._start()
+        if self.buffered >= self.max_pending:
+            self.waits += 1
+            self._wake.set()
+            async with self._space:
+                await self._space.wait_for(lambda: self.buffered < self.max_pending)
+        chat.timestamp = chat.timestamp.replace(microsecond=0)
+        self._pending.append(chat)
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    def pending_for(self, user_id):
+        return [chat for chat in self._flushing + self._pending if chat.user_id == user_id]
+
+    # Write everything buffered so far; returns the number of rows written
+    async def flush(self):
+        if self._task is None:
+            return 0
+        async with self._lock:
+            written = 0
+            while self._pending:
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                self._flushing = batch
+                try:
+                    written += await self._write(batch)
+                except BaseException:
+                    # Keep the rows (also when cancelled mid-write) for the next flush
+                    self._pending = batch + self._pending
+                    raise
+                finally:
+                    self._flushing = []
+                    async with self._space:
+                        self._space.notify_all()
+            return written
+
+    async def _write(self, batch):
+        try:
+            async with self.engine.begin() as conn:
+                await conn.execute(insert(Chat.__table__), [chat_row(chat) for chat in batch])
+                await conn.execute(history_version_bump({chat.user_id for chat in batch}))
+            self.commits += 1
+            self.flushed += len(batch)
+            return len(batch)
+        except IntegrityError:
+            logging.warning("Batched chat insert failed, retrying %d rows one by one", len(batch))
+        # A bad row (e.g. unknown user_id) must not hold back the rest of the batch
+        written = 0
+        for chat in batch:
+            try:
+                async with self.engine.begin() as conn:
+                    await conn.execute(insert(Chat.__table__), [chat_row(chat)])
+                    await conn.execute(history_version_bump([chat.user_id]))
+                self.commits += 1
+                written += 1
+            except IntegrityError as e:
+                self.dropped += 1
+                # Only the exception type: its text may include the bound message and response
+                logging.error("Dropping buffered chat for user_id=%s: %s", chat.user_id, type(e).__name__)
+        self.flushed += written
+        return written
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error("Error flushing buffered chats: %s", type(e).__name__)
+                await asyncio.sleep(self.flush_interval)
+
+    # Flush-on-shutdown hook: stop the background flusher and write whatever is left
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await self.flush()
+        self._task = None
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "buffered": self.buffered,
+            "flushed": self.flushed,
+            "commits": self.commits,
+            "backpressure_waits": self.waits,
+            "dropped": self.dropped,
+        }